@@ -1,9 +1,17 @@
 import argparse
+import bisect
 
 from lxml import etree
 import re
-import xmltodict, jsonpickle
+import sys
+import copy
+from collections.abc import MutableSet
 from decorator import Dumper
+try:
+    import numpy as np
+except ImportError:
+    # Optional, only for GDLArray
+    np = None
 
 AC_18   = 28
 
@@ -56,6 +64,59 @@ PARAM_TYPES = {"Pens":      PAR_PEN,
                "Profiles":    PAR_PROF,
                }
 
+PARAM_TAGS = {PAR_LENGTH:      "Length",
+              PAR_ANGLE:       "Angle",
+              PAR_REAL:        "RealNum",
+              PAR_INT:         "Integer",
+              PAR_BOOL:        "Boolean",
+              PAR_STRING:      "String",
+              PAR_MATERIAL:    "Material",
+              PAR_LINETYPE:    "LineType",
+              PAR_FILL:        "FillPattern",
+              PAR_PEN:         "PenColor",
+              PAR_SEPARATOR:   "Separator",
+              PAR_TITLE:       "Title",
+              PAR_LIGHTSW:     "LightSwitch",
+              PAR_COLORRGB:    "ColorRGB",
+              PAR_INTENSITY:   "Intensity",
+              PAR_BMAT:        "BuildingMaterial",
+              PAR_PROF:        "Profile",
+              PAR_DICT:        "Dictionary",
+              PAR_COMMENT:     "Comment",
+              }
+
+TAG_PARAM_TYPES = {tag: iType for iType, tag in PARAM_TAGS.items()}
+TAG_PARAM_TYPES["Real"] = PAR_REAL
+
+# Param type guessed from the hungarian prefix of the name, in order of precedence
+NAME_PREFIX_TYPES = ((PAR_BOOL,    r"is[A-Z]|b[A-Z]"),
+                     (PAR_INT,     r"i[A-Z]|n[A-Z]"),
+                     (PAR_STRING,  r"s[A-Z]|st[A-Z]|mp_"),
+                     (PAR_LENGTH,  r"[xyz][A-Z]"),
+                     (PAR_ANGLE,   r"a[A-Z]"),
+                     )
+_NAME_PREFIX_RE = re.compile("|".join(r"(?P<t%d>%s)" % (iType, prefix) for iType, prefix in NAME_PREFIX_TYPES))
+
+
+def getTypeFromName(inParName, inDefault=PAR_STRING):
+    """
+    Param type from the hungarian prefix of inParName like iCount, xWidth or bVisible, inDefault if there is none
+    """
+    m = _NAME_PREFIX_RE.match(inParName)
+    return int(m.lastgroup[1:]) if m else inDefault
+
+
+def getTypesFromNames(inParNames, inDefault=PAR_STRING):
+    """
+    getTypeFromName() for many names at once
+    """
+    match = _NAME_PREFIX_RE.match
+    result = []
+    for name in inParNames:
+        m = match(name)
+        result.append(int(m.lastgroup[1:]) if m else inDefault)
+    return result
+
 # ------------------- parameter classes --------------------------------------------------------------------------------
 
 class ArgParse(argparse.ArgumentParser):
@@ -67,19 +128,380 @@ class ArgParse(argparse.ArgumentParser):
             pass
 
 
+class ParamCommand:
+    """
+    A parsed command sheet cell, see ParamSection.compileCommand()
+    name:       param name, the first word of the cell
+    args:       argparse namespace of the options
+    desc:       description joined from the -d words, '' if not given
+    parType:    PAR_* type given by -t, PAR_UNKNOWN if not given or not recognized
+    firstDimension, secondDimension:    int indices of -1 and -2, None if not given
+    """
+    def __init__(self, inName, inArgs):
+        self.name   = inName
+        self.args   = inArgs
+        self.desc   = " ".join(inArgs.desc) if inArgs.desc is not None else ''
+        self.firstDimension     = int(inArgs.firstDimension) if inArgs.firstDimension else None
+        self.secondDimension    = int(inArgs.secondDimension) if inArgs.secondDimension else None
+
+        parType = TAG_PARAM_TYPES.get(inArgs.type, PAR_UNKNOWN) if inArgs.type else PAR_UNKNOWN
+        if parType == PAR_DICT:
+            # Dictionary values can't be given in a cell
+            parType = PAR_UNKNOWN
+        self.parType = parType
+
+    def __repr__(self):
+        return self.name
+
+
+class CommandResult:
+    """
+    Outcome of one row of ParamSection.applyCommands()
+    """
+    def __init__(self, inRow, inName, inParam, inError=None):
+        self.row    = inRow
+        self.name   = inName
+        self.param  = inParam
+        self.error  = inError
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "%d: %s %s" % (self.row, self.name, "OK" if self.ok else repr(self.error))
+
+
+class ParamChange:
+    """
+    One difference found by ParamSection.diff() or Param.diff()
+    kind:       one of the kinds below
+    name:       param name
+    old, new:   INSERT/DELETE: None and the Param; MOVE: old and new position; TYPE, DESC, FLAGS, VALUE: the old and
+                new type, description, set of flags or value
+    position:   position of the param in the new section, in the old one for DELETE
+    cells:      CELLS: list of (path, old value, new value) of the changed array or dictionary cells, paths like in
+                Param.iterCells() without the name; None for a cell that is only on one side
+    """
+    INSERT  = "insert"
+    DELETE  = "delete"
+    MOVE    = "move"
+    TYPE    = "type"
+    DESC    = "desc"
+    FLAGS   = "flags"
+    VALUE   = "value"
+    CELLS   = "cells"
+
+    def __init__(self, inKind, inName, inOld=None, inNew=None, inPosition=None, inCells=None):
+        self.kind       = inKind
+        self.name       = inName
+        self.old        = inOld
+        self.new        = inNew
+        self.position   = inPosition
+        self.cells      = inCells
+
+    def __repr__(self):
+        if self.kind == self.CELLS:
+            return "%s %s: %d cells" % (self.kind, self.name, len(self.cells))
+        return "%s %s: %r -> %r" % (self.kind, self.name, self.old, self.new)
+
+
+def _longestIncreasing(inValues):
+    """
+    Positions of a longest strictly increasing subsequence of inValues, in O(n log n)
+    """
+    tails = []          # tails[k]: smallest value ending an increasing run of length k + 1
+    tailPositions = []
+    previous = [-1] * len(inValues)
+    for i, v in enumerate(inValues):
+        k = bisect.bisect_left(tails, v)
+        if k == len(tails):
+            tails.append(v)
+            tailPositions.append(i)
+        else:
+            tails[k] = v
+            tailPositions[k] = i
+        previous[i] = tailPositions[k - 1] if k else -1
+    result = set()
+    i = tailPositions[-1] if tailPositions else -1
+    while i >= 0:
+        result.add(i)
+        i = previous[i]
+    return result
+
+
+class ParamList:
+    """
+    Ordered container of params: doubly linked list with a name -> node map
+    Every node carries an order label so that the relative order of two params can be told without walking the list;
+    positional access (int index, name -> position) goes through a snapshot that is rebuilt only after a mutation
+    For duplicate names (e.g. comments) the first occurrence is the one found by name, like list.index()
+    """
+    LABEL_GAP = 1 << 16
+
+    class _Node:
+        __slots__ = ("param", "prev", "next", "label", )
+
+        def __init__(self, inParam):
+            self.param = inParam
+            self.prev  = None
+            self.next  = None
+            self.label = 0
+
+    def __init__(self, inParams=None):
+        self.__head         = None
+        self.__tail         = None
+        self.__len          = 0
+        self.__nameDict     = {}        # name          -> first node with that name
+        self.__nodeDict     = {}        # id(param)     -> node
+        self.__snapshot     = None      # list of params, positional view
+        self.__posDict      = None      # name          -> position, built with the snapshot
+        if inParams:
+            self.extend(inParams)
+
+    def __reduce__(self):
+        # Both pickle and deepcopy go through here instead of recursing along the node chain
+        return self.__class__, (list(self), )
+
+    def __len__(self):
+        return self.__len
+
+    def __iter__(self):
+        node = self.__head
+        while node is not None:
+            _next = node.next
+            yield node.param
+            node = _next
+
+    def __contains__(self, inName):
+        return inName in self.__nameDict
+
+    def __getitem__(self, item):
+        return self.__getSnapshot()[item]
+
+    def __getSnapshot(self):
+        if self.__snapshot is None:
+            self.__snapshot = list(self)
+            self.__posDict = {}
+            for i, p in enumerate(self.__snapshot):
+                if p.name not in self.__posDict:
+                    self.__posDict[p.name] = i
+        return self.__snapshot
+
+    def __invalidate(self):
+        self.__snapshot = None
+        self.__posDict  = None
+
+    def index(self, inName):
+        """
+        Position of the first param called inName
+        :raises ValueError: like list.index() if there is no such param
+        """
+        if inName not in self.__nameDict:
+            raise ValueError("%s is not in ParamList" % inName)
+        self.__getSnapshot()
+        return self.__posDict[inName]
+
+    def get(self, inName):
+        return self.__nameDict[inName].param
+
+    def getNext(self, inParam):
+        node = self.__nodeDict[id(inParam)].next
+        return node.param if node is not None else None
+
+    def getPrev(self, inParam):
+        node = self.__nodeDict[id(inParam)].prev
+        return node.param if node is not None else None
+
+    def iterFrom(self, inName):
+        """
+        Iterates from the param called inName (inclusive) to the end
+        """
+        node = self.__nameDict[inName]
+        while node is not None:
+            yield node.param
+            node = node.next
+
+    def isBefore(self, inParam, inOtherParam):
+        return self.__nodeDict[id(inParam)].label < self.__nodeDict[id(inOtherParam)].label
+
+    def orderKey(self, inParam):
+        """
+        Sort key giving the order of params in the list; only valid until the next insertion
+        """
+        return self.__nodeDict[id(inParam)].label
+
+    def append(self, inParam):
+        self.__link(self._Node(inParam), self.__tail, None)
+
+    def extend(self, inParams):
+        """
+        Appending many params in one go, without the per-node bookkeeping of append()
+        """
+        prev = self.__tail
+        label = prev.label if prev is not None else 0
+        nodeDict = self.__nodeDict
+        nameDict = self.__nameDict
+        _Node = self._Node
+        for p in inParams:
+            node = _Node(p)
+            label += self.LABEL_GAP
+            node.label = label
+            node.prev = prev
+            if prev is not None:
+                prev.next = node
+            else:
+                self.__head = node
+            prev = node
+            nodeDict[id(p)] = node
+            if p.name not in nameDict:
+                nameDict[p.name] = node
+            self.__len += 1
+        self.__tail = prev
+        self.__invalidate()
+
+    def insertAfter(self, inName, inParam):
+        prev = self.__nameDict[inName]
+        self.__link(self._Node(inParam), prev, prev.next)
+
+    def insertBefore(self, inName, inParam):
+        following = self.__nameDict[inName]
+        self.__link(self._Node(inParam), following.prev, following)
+
+    def insertAfterParam(self, inPrevParam, inParam):
+        prev = self.__nodeDict[id(inPrevParam)]
+        self.__link(self._Node(inParam), prev, prev.next)
+
+    def replace(self, inParam, inNewParam):
+        """
+        Putting inNewParam in the place of inParam; they must have the same name
+        The order doesn't change, so the snapshot is kept with the slot of inParam swapped
+        """
+        node = self.__nodeDict[id(inParam)]
+        if self.__snapshot is not None:
+            if self.__nameDict[inParam.name] is node:
+                # The first occurrence, the one in posDict
+                pos = self.__posDict[inParam.name]
+            else:
+                # A later duplicate: binary search by order label, valid as the snapshot is dropped at insertions
+                pos, hi = self.__posDict[inParam.name], self.__len
+                while pos < hi:
+                    mid = (pos + hi) // 2
+                    if self.__nodeDict[id(self.__snapshot[mid])].label < node.label:
+                        pos = mid + 1
+                    else:
+                        hi = mid
+            self.__snapshot[pos] = inNewParam
+        del self.__nodeDict[id(inParam)]
+        node.param = inNewParam
+        self.__nodeDict[id(inNewParam)] = node
+
+    def remove(self, inParam):
+        node = self.__nodeDict.pop(id(inParam))
+        if node.prev is not None:
+            node.prev.next = node.next
+        else:
+            self.__head = node.next
+        if node.next is not None:
+            node.next.prev = node.prev
+        else:
+            self.__tail = node.prev
+        self.__len -= 1
+
+        name = inParam.name
+        if self.__nameDict.get(name) is node:
+            # Looking for a later param with the same name, only happens with duplicates
+            del self.__nameDict[name]
+            _n = node.next
+            while _n is not None:
+                if _n.param.name == name:
+                    self.__nameDict[name] = _n
+                    break
+                _n = _n.next
+        self.__invalidate()
+
+    def __link(self, inNode, inPrev, inNext):
+        inNode.prev = inPrev
+        inNode.next = inNext
+        if inPrev is not None:
+            inPrev.next = inNode
+        else:
+            self.__head = inNode
+        if inNext is not None:
+            inNext.prev = inNode
+        else:
+            self.__tail = inNode
+        self.__len += 1
+        self.__nodeDict[id(inNode.param)] = inNode
+        self.__setLabel(inNode)
+
+        name = inNode.param.name
+        if name not in self.__nameDict or inNode.label < self.__nameDict[name].label:
+            self.__nameDict[name] = inNode
+        self.__invalidate()
+
+    def __setLabel(self, inNode):
+        lo = inNode.prev.label if inNode.prev is not None else 0
+        if inNode.next is None:
+            inNode.label = lo + self.LABEL_GAP
+        elif inNode.next.label - lo > 1:
+            inNode.label = (lo + inNode.next.label) // 2
+        else:
+            inNode.label = lo
+            self.__relabelAround(inNode)
+
+    def __relabelAround(self, inNode):
+        """
+        No room between the neighbours: spreading out the labels of the smallest aligned label range around inNode
+        that is sparse enough: at most (4/3) ** bits nodes in 2 ** bits labels, or no denser than appended nodes
+        Only the nodes of that range are relabeled, not the whole list
+        """
+        first = last = inNode
+        count = 1
+        bits = 0
+        while True:
+            bits += 1
+            base = (inNode.label >> bits) << bits
+            top = base + (1 << bits)
+            while first.prev is not None and first.prev.label >= base:
+                first = first.prev
+                count += 1
+            while last.next is not None and last.next.label < top:
+                last = last.next
+                count += 1
+            if count <= (4 / 3) ** bits or count * self.LABEL_GAP <= 1 << bits:
+                break
+        step = (1 << bits) // count
+        label = base + step // 2
+        node = first
+        while True:
+            node.label = label
+            if node is last:
+                break
+            label += step
+            node = node.next
+
+
 class ParamSection:
     """
     iterable class of all params
     """
-    def __init__(self, inETree):
+    _commandParser = None
+    def __init__(self, inETree, inLazy=False):
+        """
+        :param inETree:     ParamSection element
+        :param inLazy:      decoding param values only on first access, see Param
+        """
         # self.eTree          = inETree
         self.__header       = etree.tostring(inETree.find("ParamSectHeader"))
         self.__wdo          = etree.tostring(inETree.find("WDOrientation")) if inETree.find("WDOrientation") is not None else ""
         self.__wdf          = etree.tostring(inETree.find("WDFrameExpression")) if inETree.find("WDFrameExpression") is not None else ""
-        self.__paramList    = []
+        self.__paramList    = ParamList()
         self.__paramDict    = {}
         self.__index        = 0
         self.usedParamSet   = {}
+        self.__shared       = set()     # id()s of params shared with copies made by copyOnWrite()
+        self.__resetIndexes()
 
         for attr in ["SectVersion", "SectionFlags", "SubIdent", ]:
             if attr in inETree.attrib:
@@ -88,9 +510,73 @@ class ParamSection:
                 setattr(self, attr, None)
 
         for p in inETree.find("Parameters"):
-            param = Param(p)
+            param = Param(p, inLazy=inLazy)
             self.append(param, param.name)
 
+    def __getstate__(self):
+        # The indexes are keyed by id(), which doesn't survive copying or pickling
+        state = self.__dict__.copy()
+        for attr in ("_ParamSection__typeIndex", "_ParamSection__typeViews", "_ParamSection__valueIndex", "_ParamSection__shared", ):
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__shared = set()
+        self.__resetIndexes()
+        for par in self.__paramList:
+            self.__indexParam(par)
+
+    def copyOnWrite(self):
+        """
+        Copy of the section sharing the Param objects with it instead of deep copying them
+        A shared param is copied by either section when it is handed out (section[name], get(), iteration, get*()
+        methods) or changed through the section; the view*() methods give shared params, not to be modified
+        """
+        state = self.__getstate__()
+        state["_ParamSection__paramList"] = ParamList(self.__paramList)
+        state["_ParamSection__paramDict"] = dict(self.__paramDict)
+        state["usedParamSet"] = copy.deepcopy(self.usedParamSet)
+        result = self.__class__.__new__(self.__class__)
+        result.__setstate__(state)
+        shared = {id(par) for par in self.__paramList}
+        result.__shared = shared
+        self.__shared |= shared
+        return result
+
+    def __own(self, inParam):
+        """
+        The param itself, or if it is shared with a copyOnWrite() copy, a private copy put in its place
+        Called before handing out a param that can be changed
+        """
+        if inParam is None or id(inParam) not in self.__shared:
+            return inParam
+        self.__shared.discard(id(inParam))
+        result = copy.deepcopy(inParam)
+        self.__paramList.replace(inParam, result)
+        if self.__paramDict.get(inParam.name) is inParam:
+            self.__paramDict[inParam.name] = result
+        self.__unindexParam(inParam)
+        self.__indexParam(result)
+        return result
+
+    def __resetIndexes(self):
+        self.__typeIndex    = {}        # iType -> {id(param): param}
+        self.__typeViews    = {}        # iType -> tuple of params in section order, built on demand
+        self.__valueIndex   = {}        # iType -> [Param.valueVersion, {value: [params in section order]}], built on demand
+
+    def __indexParam(self, inParam):
+        # A new param can get the id() of a shared one that was freed since
+        self.__shared.discard(id(inParam))
+        self.__typeIndex.setdefault(inParam.iType, {})[id(inParam)] = inParam
+        self.__typeViews.pop(inParam.iType, None)
+        self.__valueIndex.pop(inParam.iType, None)
+
+    def __unindexParam(self, inParam):
+        self.__typeIndex.get(inParam.iType, {}).pop(id(inParam), None)
+        self.__typeViews.pop(inParam.iType, None)
+        self.__valueIndex.pop(inParam.iType, None)
+
     def __iter__(self):
         return self
 
@@ -99,55 +585,145 @@ class ParamSection:
             raise StopIteration
         else:
             self.__index += 1
-            return self.__paramList[self.__index]
+            return self.__own(self.__paramList[self.__index])
 
     def __getNext(self, inParam):
         """
         Gives back next parameter
         """
-        _index = self.__paramList.index(inParam)
-        if _index+1 < len(self.__paramList):
-            return self.__paramList[_index+1]
+        return self.__paramList.getNext(inParam)
 
     def __getPrev(self, inParam):
         """
         Gives previous next parameter
         """
-        _index = self.__paramList.index(inParam)
-        if _index > 0:
-            return self.__paramList[_index-1]
+        return self.__paramList.getPrev(inParam)
 
     def __contains__(self, item):
         return item in self.__paramDict
 
+    def iterParams(self):
+        """
+        All params in order, comments included; unlike iter(section), can be started over any time
+        """
+        for par in list(self.__paramList):
+            yield self.__own(par)
+
+    def diff(self, inOther):
+        """
+        Structural differences from this section to inOther: params are matched by name (repeated names, like those
+        of comments, by occurrence), moves are the fewest needed to give inOther's order
+        Params shared by copyOnWrite() are not compared
+        :return:    list of ParamChange: deletes in this section's order, then inserts, moves and the changes of the
+                    matched params in inOther's order
+        """
+        oldItems = self.__keyedParams()
+        oldDict = {key: (i, par) for i, (key, par) in enumerate(oldItems)}
+        newItems = inOther.__keyedParams()
+        newKeys = {key for key, _ in newItems}
+
+        result = [ParamChange(ParamChange.DELETE, par.name, par, None, i) for i, (key, par) in enumerate(oldItems)
+                  if key not in newKeys]
+        matched = []
+        for j, (key, par) in enumerate(newItems):
+            if key in oldDict:
+                matched.append((oldDict[key][0], j, oldDict[key][1], par))
+        stable = _longestIncreasing([i for i, _, _, _ in matched])
+
+        m = 0
+        for j, (key, par) in enumerate(newItems):
+            if key not in oldDict:
+                result.append(ParamChange(ParamChange.INSERT, par.name, None, par, j))
+                continue
+            i, _, old, _ = matched[m]
+            if m not in stable:
+                result.append(ParamChange(ParamChange.MOVE, par.name, i, j, j))
+            m += 1
+            if old is not par:
+                for change in old.diff(par):
+                    change.position = j
+                    result.append(change)
+        return result
+
+    def __keyedParams(self):
+        """
+        [((name, occurrence), param), ...] in order
+        """
+        seen = {}
+        result = []
+        for par in self.__paramList:
+            n = seen.get(par.name, 0)
+            seen[par.name] = n + 1
+            result.append(((par.name, n), par))
+        return result
+
     def __setitem__(self, key, value):
         if key in self.__paramDict:
-            self.__paramDict[key].setValue(value)
+            par = self.__own(self.__paramDict[key])
+            valueIndex = self.__valueIndex.get(par.iType)
+            if valueIndex is not None and valueIndex[0] == Param.valueVersion:
+                # Index is up to date, moving the param to its new value's list instead of dropping the index
+                oldValue = par.value
+                par.setValue(value)
+                valueIndex[1][oldValue].remove(par)
+                if not valueIndex[1][oldValue]:
+                    del valueIndex[1][oldValue]
+                newList = valueIndex[1].setdefault(par.value, [])
+                newList.append(par)
+                newList.sort(key=self.__paramList.orderKey)
+                valueIndex[0] = Param.valueVersion
+            else:
+                par.setValue(value)
         else:
             _param = self.createParam(value, key)
             self.append(value, _param)
 
     def __delitem__(self, key):
         del self.__paramDict[key]
-        self.__paramList = [i for i in self.__paramList if i.name != key]
+        while key in self.__paramList:
+            par = self.__paramList.get(key)
+            self.__paramList.remove(par)
+            self.__unindexParam(par)
+            self.__shared.discard(id(par))
 
     def __getitem__(self, item):
         if isinstance(item, int):
-            return self.__paramList[item]
+            return self.__own(self.__paramList[item])
         if isinstance(item, str):
-            return self.__paramDict[item]
+            return self.__own(self.__paramDict[item])
+
+    def __len__(self):
+        return len(self.__paramList)
 
     def append(self, inEtree, inParName):
         #Adding param to the end
         self.__paramList.append(inEtree)
+        self.__indexParam(inEtree)
         if not isinstance(inEtree, etree._Comment):
             self.__paramDict[inParName] = inEtree
 
     def insertAfter(self, inParName, inEtree):
-        self.__paramList.insert(self.__getIndex(inParName) + 1, inEtree)
+        """
+        Inserting after the first param called inParName, like the list.index() based insertion did
+        The new param can also be got by name, see __register()
+        """
+        self.__paramList.insertAfter(inParName, inEtree)
+        self.__indexParam(inEtree)
+        self.__register(inEtree)
 
     def insertBefore(self, inParName, inEtree):
-        self.__paramList.insert(self.__getIndex(inParName), inEtree)
+        """
+        Inserting in front of the first param called inParName, see insertAfter()
+        """
+        self.__paramList.insertBefore(inParName, inEtree)
+        self.__indexParam(inEtree)
+        self.__register(inEtree)
+
+    def __register(self, inParam):
+        # Comments (e.g. the PARAMETER BLOCK one in front of a new Title) are only kept in order, and an inserted
+        # duplicate doesn't take the name over from the param already found by it
+        if inParam.iType != PAR_COMMENT:
+            self.__paramDict.setdefault(inParam.name, inParam)
 
     def insertAsChild(self, inParentParName, inEtree):
         """
@@ -157,25 +733,24 @@ class ParamSection:
         :param inPos:      position, 0 is first, -1 is last #FIXME
         :return:
         """
-        base = self.__getIndex(inParentParName)
-        i = 1
-        if self.__paramList[base].iType == PAR_TITLE:
-            nP = self.__paramList[base + i]
-            try:
-                while nP.iType != PAR_TITLE and \
-                        PARFLG_CHILD in nP.flags:
-                    i += 1
-                    nP = self.__paramList[base + i]
-            except IndexError:
-                pass
-            self.__paramList.insert(base + i, inEtree)
+        parent = self.__paramList.get(inParentParName)
+        if parent.iType == PAR_TITLE:
+            lastChild = parent
+            nP = self.__paramList.getNext(parent)
+            while nP is not None and nP.iType != PAR_TITLE and \
+                    PARFLG_CHILD in nP.flags:
+                lastChild = nP
+                nP = self.__paramList.getNext(nP)
+            self.__paramList.insertAfterParam(lastChild, inEtree)
+            self.__indexParam(inEtree)
             self.__paramDict[inEtree.name] = inEtree
 
     def remove_param(self, inParName):
         if inParName in self.__paramDict:
             obj = self.__paramDict[inParName]
-            while obj in self.__paramList:
-                self.__paramList.remove(obj)
+            self.__paramList.remove(obj)
+            self.__unindexParam(obj)
+            self.__shared.discard(id(obj))
             del self.__paramDict[inParName]
 
     def upsert_param(self, inParName):
@@ -183,7 +758,7 @@ class ParamSection:
         pass
 
     def __getIndex(self, inName):
-        return [p.name for p in self.__paramList].index(inName)
+        return self.__paramList.index(inName)
 
     def get(self, inName):
         '''
@@ -191,7 +766,7 @@ class ParamSection:
         :param inName:
         :return:
         '''
-        return self.__paramList[self.__getIndex(inName)]
+        return self.__own(self.__paramList.get(inName))
 
     def getChildren(self, inETree):
         """
@@ -200,122 +775,214 @@ class ParamSection:
         :return:        List of children, as lxml Elements
         """
         result = []
-        idx = self.__getIndex(inETree.name)
         if inETree.iType != PAR_TITLE:    return None
-        for p in self.__paramList[idx:]:
+        for p in self.__paramList.iterFrom(inETree.name):
             if PARFLG_CHILD in p.flags:
-                result.append(p)
+                result.append(self.__own(p))
             else:
                 return result
 
+    def __iterParamElements(self):
+        """
+        Yields the params' elements one by one, with their tails already set
+        The tail of an element depends on the next param (a blank line goes before comments), so every element is
+        held back until the next param is seen
+        """
+        elem = None
+        for par in self.__paramList:
+            if elem is not None and par.iType == PAR_COMMENT:
+                elem.tail = '\n\n\t\t'
+            try:
+                # Not cached, so that writing a section out doesn't leave an element behind in every param
+                _elem = par.makeETree()
+            except Exception as e:
+                _elem = None
+                print(e)
+            if elem is not None:
+                yield elem
+            elem = _elem
+        if elem is not None:
+            elem.tail = '\n\t'
+            yield elem
+
+    def __headerElement(self):
+        _header = etree.fromstring(self.__header)
+        _header.tail = '\n\t'
+        return _header
+
+    @staticmethod
+    def __cdataizedElement(inString, inTail):
+        _elem = etree.fromstring(inString)
+        for _w in _elem.iterchildren():
+            if _w.text is not None:
+                _w.text = etree.CDATA(_w.text)
+        _elem.tail = inTail
+        return _elem
+
+    def __trailingElements(self):
+        """
+        WDFrameExpression and WDOrientation after Parameters, if any
+        """
+        result = []
+        if self.__wdf:
+            result.append(self.__cdataizedElement(self.__wdf, '\n\t'))
+        if self.__wdo:
+            result.append(self.__cdataizedElement(self.__wdo, '\n'))
+        return result
+
     def toEtree(self):
         eTree = etree.Element("ParamSection", SectVersion=self.SectVersion, SectionFlags=self.SectionFlags, SubIdent=self.SubIdent, )
         eTree.text = '\n\t'
-        _header = etree.fromstring(self.__header)
-        _header.tail = '\n\t'
-        eTree.append(_header)
+        eTree.append(self.__headerElement())
         eTree.tail = '\n'
 
         parTree = etree.Element("Parameters")
         parTree.text = '\n\t\t'
         parTree.tail = '\n'
         eTree.append(parTree)
-        for par in self.__paramList:
-            try:
-                elem = par.eTree
-                ix = self.__paramList.index(par)
-                if ix == len(self.__paramList) - 1:
-                    elem.tail = '\n\t'
-                else:
-                    if self.__paramList[ix + 1].iType == PAR_COMMENT:
-                        elem.tail = '\n\n\t\t'
-                parTree.append(elem)
-            except Exception as e:
-                print(e)
-        if self.__wdf:
-            parTree.tail = '\n\t'
-            _wdf = etree.fromstring(self.__wdf)
-            for _w in _wdf.iterchildren():
-                if _w.text is not None:
-                    _w.text = etree.CDATA(_w.text)
-            _wdf.tail = '\n\t'
-            eTree.append(_wdf)
-        if self.__wdo:
+        for elem in self.__iterParamElements():
+            parTree.append(elem)
+        for elem in self.__trailingElements():
             parTree.tail = '\n\t'
-            _wdo = etree.fromstring(self.__wdo)
-            for _w in _wdo.iterchildren():
-                if _w.text is not None:
-                    _w.text = etree.CDATA(_w.text)
-            _wdo.tail = '\n'
-            eTree.append(_wdo)
+            eTree.append(elem)
         return eTree
 
-    def createParamfromCSV(self, inParName, inCol, inArrayValues = None):
+    def write(self, inXMLFile):
+        """
+        Writes the section into an open lxml incremental writer (etree.xmlfile), param by param, without building
+        the whole tree; formatting is the same as toEtree()'s
+        :param inXMLFile:   etree.xmlfile context, can be in the middle of a bigger document
+        :return:
+        """
+        trailingElements = self.__trailingElements()
+        with inXMLFile.element("ParamSection", {"SectVersion": self.SectVersion, "SectionFlags": self.SectionFlags, "SubIdent": self.SubIdent, }):
+            inXMLFile.write('\n\t')
+            inXMLFile.write(self.__headerElement())
+            with inXMLFile.element("Parameters"):
+                inXMLFile.write('\n\t\t')
+                for elem in self.__iterParamElements():
+                    inXMLFile.write(elem)
+            inXMLFile.write('\n\t' if trailingElements else '\n')
+            for elem in trailingElements:
+                inXMLFile.write(elem)
+
+    def toFile(self, inFile):
+        """
+        Streams the section as a standalone xml document, byte-identical to
+        etree.tostring(self.toEtree(), pretty_print=True, xml_declaration=True, encoding='UTF-8')
+        :param inFile:      binary file object
+        :return:
+        """
+        with etree.xmlfile(inFile, encoding="UTF-8") as xf:
+            xf.write_declaration()
+            self.write(xf)
+        inFile.write(b'\n\n')
+
+    @classmethod
+    def getCommandParser(cls):
+        """
+        The parser of command sheet cells, built once
+        """
+        if cls._commandParser is None:
+            ap = ArgParse(add_help=False)
+            ap.add_argument("-d", "--desc" , "--description", nargs="+")        # action=ConcatStringAction,
+            ap.add_argument("-t", "--type")
+            ap.add_argument("-f", "--frontof" )
+            ap.add_argument("-a", "--after" )
+            ap.add_argument("-c", "--child")
+            ap.add_argument("-h", "--hidden", action='store_true')
+            ap.add_argument("-b", "--bold", action='store_true')
+            ap.add_argument("-u", "--unique", action='store_true')
+            ap.add_argument("-o", "--overwrite", action='store_true')
+            ap.add_argument("-i", "--inherit", action='store_true', help='Inherit properties form the other parameter')
+            ap.add_argument("-y", "--array", action='store_true', help='Insert an array of [0-9]+ or  [0-9]+x[0-9]+ size')
+            ap.add_argument("-r", "--remove", action='store_true')
+            ap.add_argument("-1", "--firstDimension")
+            ap.add_argument("-2", "--secondDimension")
+            # ap.add_argument("-t", "--dictionary")
+            cls._commandParser = ap
+        return cls._commandParser
+
+    @classmethod
+    def compileCommand(cls, inParName):
+        """
+        Parsing a command sheet cell like "iParName -a sOtherPar -t Integer" into a ParamCommand
+        """
         splitPars = inParName.split(" ")
-        parName = splitPars[0]
-        ap = ArgParse(add_help=False)
-        ap.add_argument("-d", "--desc" , "--description", nargs="+")        # action=ConcatStringAction,
-        ap.add_argument("-t", "--type")
-        ap.add_argument("-f", "--frontof" )
-        ap.add_argument("-a", "--after" )
-        ap.add_argument("-c", "--child")
-        ap.add_argument("-h", "--hidden", action='store_true')
-        ap.add_argument("-b", "--bold", action='store_true')
-        ap.add_argument("-u", "--unique", action='store_true')
-        ap.add_argument("-o", "--overwrite", action='store_true')
-        ap.add_argument("-i", "--inherit", action='store_true', help='Inherit properties form the other parameter')
-        ap.add_argument("-y", "--array", action='store_true', help='Insert an array of [0-9]+ or  [0-9]+x[0-9]+ size')
-        ap.add_argument("-r", "--remove", action='store_true')
-        ap.add_argument("-1", "--firstDimension")
-        ap.add_argument("-2", "--secondDimension")
-        # ap.add_argument("-t", "--dictionary")
-
-        parsedArgs = ap.parse_known_args(splitPars)[0]
-
-        if parsedArgs.desc is not None:
-            desc = " ".join(parsedArgs.desc)
-        else:
-            desc = ''
+        return ParamCommand(splitPars[0], cls.getCommandParser().parse_known_args(splitPars)[0])
+
+    @classmethod
+    def compileCommandSheet(cls, inRows):
+        """
+        Parsing a whole command sheet up front
+        :param inRows:  iterable of (command, value) or (command, value, arrayValues) rows
+        :return:        list of (ParamCommand, value, arrayValues) tuples; ParamCommand is None for rows that couldn't
+                        be parsed, then the exception is in place of the value
+        """
+        result = []
+        for row in inRows:
+            try:
+                result.append((cls.compileCommand(row[0]), row[1], row[2] if len(row) > 2 else None))
+            except Exception as e:
+                result.append((None, e, None))
+        return result
+
+    @classmethod
+    def classifyCommandSheet(cls, inRows):
+        """
+        Types of the params a command sheet would create: given by -t, otherwise by the name's prefix
+        :param inRows:  same as for applyCommands()
+        :return:        list of PAR_* types, one per row; PAR_UNKNOWN for rows that couldn't be parsed
+        """
+        rows = list(inRows)
+        if rows and not isinstance(rows[0][0], (ParamCommand, type(None))):
+            rows = cls.compileCommandSheet(rows)
+        nameTypes = iter(getTypesFromNames([command.name for command, _, _ in rows if command is not None and not command.parType]))
+        return [PAR_UNKNOWN if command is None else command.parType or next(nameTypes) for command, _, _ in rows]
+
+    def applyCommands(self, inRows, inStopOnError=False):
+        """
+        Applying a command sheet to the section in one pass
+        The parser is built only once and the positional index of the section is rebuilt only when asked for,
+        after the whole batch
+        :param inRows:          iterable of (command, value[, arrayValues]) rows, or the result of compileCommandSheet()
+        :param inStopOnError:   stop at the first failing row instead of collecting the errors
+        :return:                list of CommandResult, one per row
+        """
+        rows = list(inRows)
+        if rows and not isinstance(rows[0][0], (ParamCommand, type(None))):
+            rows = self.compileCommandSheet(rows)
+        result = []
+        for i, (command, col, arrayValues) in enumerate(rows):
+            if command is None:
+                result.append(CommandResult(i, None, None, col))
+            else:
+                try:
+                    param = self.applyCommand(command, col, arrayValues)
+                    result.append(CommandResult(i, command.name, param))
+                except Exception as e:
+                    result.append(CommandResult(i, command.name, None, e))
+            if inStopOnError and result[-1].error is not None:
+                break
+        return result
+
+    def createParamfromCSV(self, inParName, inCol, inArrayValues = None):
+        self.applyCommand(self.compileCommand(inParName), inCol, inArrayValues)
+
+    def applyCommand(self, inCommand, inCol, inArrayValues = None):
+        """
+        Applying one compiled command sheet cell
+        :return:    the created or changed Param, None if it was removed
+        """
+        parName = inCommand.name
+        parsedArgs = inCommand.args
+        desc = inCommand.desc
 
         if parName not in self:
             parType = PAR_UNKNOWN
             if parsedArgs.type:
-                if parsedArgs.type in ("Length", ):
-                    parType = PAR_LENGTH
-                elif parsedArgs.type in ("Angle", ):
-                    parType = PAR_ANGLE
-                elif parsedArgs.type in ("RealNum", ):
-                    parType = PAR_REAL
-                elif parsedArgs.type in ("Integer", ):
-                    parType = PAR_INT
-                elif parsedArgs.type in ("Boolean", ):
-                    parType = PAR_BOOL
-                elif parsedArgs.type in ("String", ):
-                    parType = PAR_STRING
-                elif parsedArgs.type in ("Material", ):
-                    parType = PAR_MATERIAL
-                elif parsedArgs.type in ("LineType", ):
-                    parType = PAR_LINETYPE
-                elif parsedArgs.type in ("FillPattern", ):
-                    parType = PAR_FILL
-                elif parsedArgs.type in ("PenColor", ):
-                    parType = PAR_PEN
-                elif parsedArgs.type in ("Separator", ):
-                    parType = PAR_SEPARATOR
-                elif parsedArgs.type in ("Title", ):
-                    parType = PAR_TITLE
-                elif parsedArgs.type in ("LightSwitch", ):
-                    parType = PAR_LIGHTSW
-                elif parsedArgs.type in ("ColorRGB", ):
-                    parType = PAR_COLORRGB
-                elif parsedArgs.type in ("Intensity", ):
-                    parType = PAR_INTENSITY
-                elif parsedArgs.type in ("BuildingMaterial", ):
-                    parType = PAR_BMAT
-                elif parsedArgs.type in ("Profile", ):
-                    parType = PAR_PROF
-                elif parsedArgs.type in ("Comment", ):
-                    parType = PAR_COMMENT
+                parType = inCommand.parType
+                if parType == PAR_COMMENT:
                     parName = " " + parName + ": PARAMETER BLOCK ===== PARAMETER BLOCK ===== PARAMETER BLOCK ===== PARAMETER BLOCK "
                 param = self.createParam(parName, inCol, inArrayValues, parType)
             else:
@@ -338,7 +1005,7 @@ class ParamSection:
                 if PARFLG_BOLDNAME  in paramToInherit.flags: param.flags.add(PARFLG_BOLDNAME)
                 if PARFLG_UNIQUE    in paramToInherit.flags: param.flags.add(PARFLG_UNIQUE)
                 if PARFLG_HIDDEN    in paramToInherit.flags: param.flags.add(PARFLG_HIDDEN)
-            elif "flags" in param.__dict__:
+            elif hasattr(param, "flags"):
                 # Comments etc have no flags
                 if parsedArgs.child:            param.flags.add(PARFLG_CHILD)
                 if parsedArgs.bold:             param.flags.add(PARFLG_BOLDNAME)
@@ -364,26 +1031,27 @@ class ParamSection:
                 paramComment = Param(inType=PAR_COMMENT,
                                      inName=" " + parName + ": PARAMETER BLOCK ===== PARAMETER BLOCK ===== PARAMETER BLOCK ===== PARAMETER BLOCK ", )
                 self.insertBefore(param.name, paramComment)
+            return param
         else:
             # Parameter already there
             if parsedArgs.remove:
                 # FIXME writing tests for this
                 if inCol:
                     del self[parName]
-            elif parsedArgs.firstDimension:
+                    return None
+            elif inCommand.firstDimension is not None:
                 # FIXME tricky, indexing according to gdl (from 1) but for lists according to Python (from 0) !!!
-                parsedArgs.firstDimension = int(parsedArgs.firstDimension)
-                if parsedArgs.secondDimension:
-                    parsedArgs.secondDimension = int(parsedArgs.secondDimension)
-                    self[parName][parsedArgs.firstDimension][parsedArgs.secondDimension] = inCol
+                if inCommand.secondDimension is not None:
+                    self[parName][inCommand.firstDimension][inCommand.secondDimension] = inCol
                 elif isinstance(inCol, list):
-                    self[parName][parsedArgs.firstDimension] = inCol
+                    self[parName][inCommand.firstDimension] = inCol
                 else:
-                    self[parName][parsedArgs.firstDimension][1] = inCol
+                    self[parName][inCommand.firstDimension][1] = inCol
             else:
                 self[parName] = inCol
                 if desc:
-                    self.__paramDict[parName].desc = " ".join(parsedArgs.desc)
+                    self[parName].desc = desc
+        return self.__paramDict.get(parName)
 
     @staticmethod
     def createParam(inParName, inCol, inArrayValues=None, inParType=None):
@@ -397,18 +1065,7 @@ class ParamSection:
         if inParType:
             parType = inParType
         else:
-            if re.match(r'\bis[A-Z]', inParName) or re.match(r'\bb[A-Z]', inParName):
-                parType = PAR_BOOL
-            elif re.match(r'\bi[A-Z]', inParName) or re.match(r'\bn[A-Z]', inParName):
-                parType = PAR_INT
-            elif re.match(r'\bs[A-Z]', inParName) or re.match(r'\bst[A-Z]', inParName) or re.match(r'\bmp_', inParName):
-                parType = PAR_STRING
-            elif re.match(r'\bx[A-Z]', inParName) or re.match(r'\by[A-Z]', inParName) or re.match(r'\bz[A-Z]', inParName):
-                parType = PAR_LENGTH
-            elif re.match(r'\ba[A-Z]', inParName):
-                parType = PAR_ANGLE
-            else:
-                parType = PAR_STRING
+            parType = getTypeFromName(inParName)
 
         if not inArrayValues:
             arrayValues = None
@@ -440,43 +1097,73 @@ class ParamSection:
                      inValue=inCol,
                      inAVals=arrayValues)
 
+    def viewParamsByType(self, param_type):
+        """
+        Params of a type in section order, from the type index
+        :return:    tuple, cached until a param of this type is added or removed; not to be modified
+        """
+        view = self.__typeViews.get(param_type)
+        if view is None:
+            view = tuple(sorted(self.__typeIndex.get(param_type, {}).values(), key=self.__paramList.orderKey))
+            self.__typeViews[param_type] = view
+        return view
+
     def getParamsByType(self, param_type):
-        resultList = []
-        for par in self.__paramList:
-            if par.iType == param_type:
-                resultList.append(par)
-        return resultList
+        return [self.__own(par) for par in self.viewParamsByType(param_type)]
+
+    def __getValueIndex(self, param_type):
+        """
+        value -> params of the given type, rebuilt when params of the type were added/removed or any Param value was
+        changed with setValue() (see Param.valueVersion) since the last query
+        """
+        valueIndex = self.__valueIndex.get(param_type)
+        if valueIndex is None or valueIndex[0] != Param.valueVersion:
+            index = {}
+            for par in self.viewParamsByType(param_type):
+                index.setdefault(par.value, []).append(par)
+            valueIndex = self.__valueIndex[param_type] = [Param.valueVersion, index]
+        return valueIndex[1]
+
+    def viewParamsByTypeNameAndValue(self, param_type, param_name="", param_desc ="", value=None):
+        """
+        Same as getParamsByTypeNameAndValue() but from the indexes, without copying
+        :return:    tuple or list of params in section order; not to be modified
+        """
+        if value and param_type == PAR_DICT:
+            # Dictionary values are not hashable
+            result = tuple(par for par in self.viewParamsByType(param_type) if par.value == value)
+        elif value:
+            result = self.__getValueIndex(param_type).get(value, ())
+        else:
+            result = self.viewParamsByType(param_type)
+        if param_name:
+            result = tuple(par for par in result if par.name == param_name)
+        # and (not param_desc or par.desc == '"' + param_desc + '"')\
+        return result
 
     def getParamsByTypeNameAndValue(self, param_type, param_name="", param_desc ="", value=None):
-        resultList = []
-        for par in self.__paramList:
-            if par.iType == param_type \
-                    and par.iType != PAR_DICT \
-                    and (par.name == param_name or not param_name) \
-                    and (par.value == value or not value):
-                # and (not param_desc or par.desc == '"' + param_desc + '"')\
-                resultList.append(par)
-            elif par.iType == PAR_DICT:
-                ...
-        return resultList
+        return [self.__own(par) for par in self.viewParamsByTypeNameAndValue(param_type, param_name, param_desc, value)]
+
+    def iterCells(self, param_type, param_name="", value=None, predicate=None):
+        """
+        Yields (path, value) pairs of the values of the section's params, see Param.iterCells()
+        """
+        for par in self.viewParamsByTypeNameAndValue(param_type, param_name):
+            yield from par.iterCells(value, predicate)
 
     # @Dumper(active=True)
     def getParamIDsByTypeNameAndValue(self, param_type, param_name="", param_desc="", value=None):
-        resultList = []
-        for par in self.__paramList:
-            if par.iType == param_type \
-            and par.iType != PAR_DICT \
-            and (par.name == param_name or not param_name):
-            # and (par.value == value or not value):
-            # and (not param_desc or par.desc == '"' + param_desc + '"')\
-                for path in par.getHashableIDs():
-                    by_path = par.getValueByPath(".".join(path.split(".")[1:]))
-                    if by_path == value or not value:
-                        # resultList.extend(par.getHashableIDs())
-                        resultList.append(path)
-            elif par.iType == PAR_DICT:
-                ...
-        return resultList
+        # and (not param_desc or par.desc == '"' + param_desc + '"')\
+        return [".".join(str(_p) for _p in path) for path, _ in self.iterCells(param_type, param_name, value)]
+
+    def getValueByCell(self, inPath):
+        """
+        :param inPath:  tuple like (name, row, column), see Param.getCellPaths()
+        """
+        return self[inPath[0]].getValueByCell(inPath[1:])
+
+    def setValueByCell(self, inPath, value):
+        self[inPath[0]].setValueByCell(inPath[1:], value)
 
     def setValueByPath(self, path:str, value):
         lPath = path.split(".")
@@ -484,21 +1171,34 @@ class ParamSection:
         self[sParName].setValueByPath(".".join(lPath[1:]), value)
 
 
+def _checkGDLIndex(inIndex):
+    # GDL indices are from 1; 0 or a negative index would wrap around to the end of a list or numpy array
+    if inIndex < 1:
+        raise IndexError("GDL array index out of range: %s" % inIndex)
+
+
 class ResizeableGDLDict(dict):
     """
     List child with indexing from 1 instead of 0
-    writing outside of list size resizes list
+    writing outside of list size resizes list, reading outside of it gives a new, empty row
+    The rows share a counter of the changes with the whole array, see changeCount
     """
     def __new__(cls, *args, **kwargs):
         result = super().__new__(ResizeableGDLDict, *args, **kwargs)
         result.firstLevel = True
         result.size = 0
+        result._changes = [0]
 
         return result
 
-    def __init__(self, inObj=None, firstLevel = True):
+    def __init__(self, inObj=None, firstLevel = True, changes=None):
+        """
+        :param changes: the change counter of the array, for its rows
+        """
         self.size = 0
         self.firstLevel = firstLevel    # For determining first or second level
+        if changes is not None:
+            self._changes = changes
         if not inObj:
             # Empty
             super(ResizeableGDLDict, self).__init__(self)
@@ -506,7 +1206,7 @@ class ResizeableGDLDict(dict):
             _d = {}
             for i in range(len(inObj)):
                 if isinstance(inObj[i], list):
-                    _d[i+1] = ResizeableGDLDict(inObj[i], firstLevel=False)
+                    _d[i+1] = ResizeableGDLDict(inObj[i], firstLevel=False, changes=self._changes)
                 else:
                     _d[i+1] = inObj[i]
                 self.size = max(self.size, i+1)
@@ -514,23 +1214,462 @@ class ResizeableGDLDict(dict):
         else:
             super(ResizeableGDLDict, self).__init__(inObj)
 
+    @property
+    def changeCount(self):
+        """
+        Number of writes into the array or any of its rows so far
+        """
+        return self._changes[0]
+
     def __getitem__(self, item):
         if item not in self:
-            dict.__setitem__(self, item, ResizeableGDLDict({}))
+            _checkGDLIndex(item)
+            dict.__setitem__(self, item, ResizeableGDLDict({}, changes=self._changes))
             self.size = max(self.size, item)
+            self._changes[0] += 1
         return dict.__getitem__(self, item)
 
     def __setitem__(self, key, value, firstLevel=True):
+        _checkGDLIndex(key)
         if self.firstLevel and isinstance(value, list):
-            dict.__setitem__(self, key, ResizeableGDLDict(value))
+            dict.__setitem__(self, key, ResizeableGDLDict(value, changes=self._changes))
         else:
             dict.__setitem__(self, key, value)
         self.size = max(self.size, key)
+        self._changes[0] += 1
+
+
+class GDLArray:
+    """
+    Dense, typed storage of a numeric array parameter's values, backed by a numpy array
+    Indexing is from 1 like in GDL, an index below 1 raises IndexError; writing or reading outside of the array's
+    size resizes it, like ResizeableGDLDict, the new cells are 0
+    1D: arr[row] is a value; 2D: arr[row] is a row view, arr[row][column] a value
+    Iterating gives the row indices, like ResizeableGDLDict's keys
+    """
+    def __init__(self, inKind, inFirstDimension=0, inSecondDimension=0):
+        """
+        :param inKind:  float, int or bool, the Python type of the values
+        """
+        self.kind = inKind
+        self.is2D = inSecondDimension > 0
+        self.changeCount = 0    # Number of writes so far, like ResizeableGDLDict.changeCount
+        shape = (inFirstDimension, inSecondDimension) if self.is2D else (inFirstDimension, )
+        self.data = np.zeros(shape, dtype={float: np.float64, int: np.int64, bool: np.bool_}[inKind])
+
+    @classmethod
+    def fromETree(cls, inKind, inETree):
+        """
+        Vectorized parsing of an ArrayValues element
+        """
+        result = cls(inKind, int(inETree.attrib["FirstDimension"]), int(inETree.attrib["SecondDimension"]))
+        rows = cls._xpathRows(inETree)
+        if not rows:
+            return result
+        texts = cls._xpathTexts(inETree)
+        if len(texts) != len(rows):
+            # Empty AVals, text() skips them
+            texts = [v.text or "0" for v in inETree.iterchildren("AVal")]
+        rows = np.array(rows, dtype=np.int64) - 1
+        texts = np.char.strip(np.array(texts))
+        if inKind is bool:
+            values = texts.astype(np.int64).astype(np.bool_)
+        else:
+            values = texts.astype(result.data.dtype)
+        if result.is2D:
+            columns = np.array(cls._xpathColumns(inETree), dtype=np.int64) - 1
+            result.__resize(rows.max() + 1, columns.max() + 1)
+            result.data[rows, columns] = values
+        else:
+            result.__resize(rows.max() + 1)
+            result.data[rows] = values
+        return result
+
+    _xpathRows      = etree.XPath("AVal/@Row", smart_strings=False)
+    _xpathColumns   = etree.XPath("AVal/@Column", smart_strings=False)
+    _xpathTexts     = etree.XPath("AVal/text()", smart_strings=False)
+
+    @classmethod
+    def fromList(cls, inKind, inList, inSecondDimension=0):
+        """
+        :return:    None if inList is not rectangular, or its rows don't fit inSecondDimension
+        """
+        if any(isinstance(x, list) for x in inList) != (inSecondDimension > 0):
+            return None
+        result = cls(inKind)
+        try:
+            result.data = np.array(inList, dtype=result.data.dtype)
+        except ValueError:
+            return None
+        result.is2D = result.data.ndim == 2
+        return result
+
+    @property
+    def firstDimension(self):
+        return self.data.shape[0]
+
+    @property
+    def secondDimension(self):
+        return self.data.shape[1] if self.is2D else 0
+
+    def __resize(self, inFirstDimension, inSecondDimension=0):
+        if self.is2D:
+            shape = (max(self.data.shape[0], inFirstDimension), max(self.data.shape[1], inSecondDimension))
+        else:
+            shape = (max(self.data.shape[0], inFirstDimension), )
+        if shape != self.data.shape:
+            data = np.zeros(shape, dtype=self.data.dtype)
+            data[tuple(slice(0, n) for n in self.data.shape)] = self.data
+            self.data = data
+            self.changeCount += 1
+
+    def _convert(self, inValue):
+        if self.kind is bool:
+            return bool(int(inValue))
+        return self.kind(inValue)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __bool__(self):
+        return self.data.shape[0] > 0
+
+    def __iter__(self):
+        return iter(range(1, self.data.shape[0] + 1))
+
+    def __getitem__(self, item):
+        _checkGDLIndex(item)
+        self.__resize(item)
+        if self.is2D:
+            return _GDLArrayRow(self, item)
+        return self.data[item - 1].item()
+
+    def __setitem__(self, key, value):
+        _checkGDLIndex(key)
+        if self.is2D:
+            if not isinstance(value, list):
+                value = [value]
+            self.__resize(key, len(value))
+            self.data[key - 1, :len(value)] = [self._convert(v) for v in value]
+        else:
+            self.__resize(key)
+            self.data[key - 1] = self._convert(value)
+        self.changeCount += 1
+
+    def getCell(self, inRow, inColumn):
+        _checkGDLIndex(inRow)
+        _checkGDLIndex(inColumn)
+        self.__resize(inRow, inColumn)
+        return self.data[inRow - 1, inColumn - 1].item()
+
+    def setCell(self, inRow, inColumn, inValue):
+        _checkGDLIndex(inRow)
+        _checkGDLIndex(inColumn)
+        self.__resize(inRow, inColumn)
+        self.data[inRow - 1, inColumn - 1] = self._convert(inValue)
+        self.changeCount += 1
+
+    def toStrings(self, inFormatter):
+        """
+        Values formatted as in ArrayValues, as a numpy array of str
+        """
+        if self.kind is bool:
+            return np.where(self.data, "1", "0")
+        if self.kind is int:
+            return self.data.astype(str)
+        return inFormatter(self.data)
+
+    def toETree(self, inFormatter):
+        """
+        Builds the ArrayValues element in one go from a string, formatted like Param.aVals
+        :param inFormatter:     vectorized float formatter, see formatFloats()
+        """
+        texts = self.toStrings(inFormatter)
+        if self.is2D:
+            cells = ['<AVal Column="%d" Row="%d">%s</AVal>' % (j + 1, i + 1, texts[i, j]) for i in range(self.data.shape[0]) for j in range(self.data.shape[1])]
+        else:
+            cells = ['<AVal Row="%d">%s</AVal>' % (i + 1, texts[i]) for i in range(self.data.shape[0])]
+        aValue = etree.fromstring('<ArrayValues FirstDimension="%d" SecondDimension="%d">\n\t\t\t\t%s\n\t\t\t</ArrayValues>'
+                                  % (self.firstDimension, self.secondDimension, "\n\t\t\t\t".join(cells)))
+        aValue.tail = '\n' + 2 * '\t'
+        return aValue
+
+
+class _GDLArrayRow:
+    """
+    A row of a 2D GDLArray, writable
+    """
+    __slots__ = ("array", "row", )
+
+    def __init__(self, inArray, inRow):
+        self.array = inArray
+        self.row = inRow
+
+    def __getitem__(self, item):
+        return self.array.getCell(self.row, item)
+
+    def __setitem__(self, key, value):
+        self.array.setCell(self.row, key, value)
+
+    def __iter__(self):
+        return iter(range(1, self.array.secondDimension + 1))
+
+    def __len__(self):
+        return self.array.secondDimension
+
+
+FLOAT_EPS           = 1E-7
+FLOAT_MAX_DIGITS    = 8
+
+
+def formatFloat(inValue, inEps=FLOAT_EPS, inMaxDigits=FLOAT_MAX_DIGITS):
+    """
+    Length/Angle/RealNum value as written into the xml: with the fewest decimals (up to inMaxDigits) that give back
+    the value within inEps, like "%.Nf" % inValue
+    round(x, n) is the same correctly rounded number as float("%.nf" % x), so there is only one formatting per value
+    """
+    lo = inValue - inEps
+    hi = inValue + inEps
+    for nDigits in range(inMaxDigits):
+        if lo < round(inValue, nDigits) < hi:
+            return '%.*f' % (nDigits, inValue)
+    return '%.*f' % (inMaxDigits, inValue)
+
+
+def formatFloatList(inValues, inEps=FLOAT_EPS, inMaxDigits=FLOAT_MAX_DIGITS):
+    """
+    formatFloat() for a whole array column; repeated values are formatted only once
+    """
+    formatted = {}
+    result = []
+    for v in inValues:
+        s = formatted.get(v)
+        if s is None:
+            s = formatFloat(v, inEps, inMaxDigits)
+            if v:
+                # 0.0 and -0.0 are the same key but are written differently
+                formatted[v] = s
+        result.append(s)
+    return result
+
+
+def formatFloats(inValues, inEps=FLOAT_EPS, inMaxDigits=FLOAT_MAX_DIGITS):
+    """
+    formatFloatList() for numpy arrays, used by GDLArray
+    :param inValues:    numpy array of floats
+    :return:            numpy array of str
+    """
+    return np.array(formatFloatList(inValues.ravel().tolist(), inEps, inMaxDigits), dtype=str).reshape(inValues.shape)
+
+
+# ------------------- Dictionary values --------------------------------------------------------------------------------
+# A Dictionary param's value is a plain python tree: dict for Dictionary (name -> item, in xml order), list for Array
+# (Index 1 at position 0), bool/int/float/str for Boolean/Integer/RealNum/String. Strings keep their quotes, like the
+# values of String params
+# Parsed values are DictItems and DictArrays, which keep the source text of their Integer, RealNum and Boolean items, so
+# that the unchanged ones are written out as they were ("2.50", "true"); they compare equal to plain dicts and lists
+
+_DICT_TEXT_TAGS = ("Integer", "RealNum", "Boolean", )
+
+
+class DictItems(dict):
+    texts = None        # name -> (parsed value, source text), for the items of _DICT_TEXT_TAGS
+
+
+class DictArray(list):
+    texts = None        # position -> (parsed value, source text), for the items of _DICT_TEXT_TAGS
+
+
+def dictFromETree(inETree):
+    """
+    :param inETree: Value or Dictionary element
+    :return:        DictItems of the items
+    """
+    return _readDictItems(DictItems(), ((item.attrib["Name"], item) for item in inETree if isinstance(item.tag, str)))
+
+
+def _readDictItems(inResult, inItems):
+    """
+    :param inResult:    DictItems or DictArray to fill
+    :param inItems:     (name or position, element) pairs
+    """
+    for key, item in inItems:
+        value = _dictItemFromETree(item)
+        if isinstance(inResult, list):
+            inResult.append(value)
+        else:
+            inResult[key] = value
+        if item.tag in _DICT_TEXT_TAGS:
+            if inResult.texts is None:
+                inResult.texts = {}
+            inResult.texts[key] = (value, item.text)
+    return inResult
+
+
+def _dictItemFromETree(inETree):
+    tag = inETree.tag
+    if tag == "Dictionary":
+        return dictFromETree(inETree)
+    elif tag == "Array":
+        items = sorted((int(item.attrib["Index"]), item) for item in inETree if isinstance(item.tag, str))
+        return _readDictItems(DictArray(), enumerate(item for _, item in items))
+    elif tag == "Integer":
+        return int(inETree.text)
+    elif tag == "RealNum":
+        return float(inETree.text)
+    elif tag == "Boolean":
+        return inETree.text.strip().lower() in ("1", "true", )
+    elif tag == "String":
+        return inETree.text or '""'
+    raise ValueError("Unknown Dictionary item: %s" % tag)
+
+
+def dictToETree(inDict, inLevel=3, inTag="Value"):
+    """
+    Dictionary value as an element, indented as a Value of a param
+    :param inDict:  see dictFromETree()
+    :param inLevel: number of tabs before inTag
+    """
+    elem = etree.Element(inTag)
+    _appendDictItems(elem, inDict, inLevel)
+    elem.tail = '\n' + (inLevel - 1) * '\t'
+    return elem
+
+
+def _dictItemTag(inValue):
+    if isinstance(inValue, dict):
+        return "Dictionary"
+    elif isinstance(inValue, (list, tuple, )):
+        return "Array"
+    elif isinstance(inValue, bool):
+        return "Boolean"
+    elif isinstance(inValue, int):
+        return "Integer"
+    elif isinstance(inValue, float):
+        return "RealNum"
+    return "String"
+
+
+def _appendDictItems(inParent, inValue, inLevel):
+    """
+    Items of inValue (dict, list or tuple) as the children of inParent
+    """
+    if isinstance(inValue, dict):
+        items = ((k, etree.Element(_dictItemTag(v), Name=k), v) for k, v in inValue.items())
+    else:
+        items = ((i, etree.Element(_dictItemTag(v), Index=str(i + 1)), v) for i, v in enumerate(inValue))
+    texts = getattr(inValue, "texts", None) or {}
+    item = None
+    for key, item, value in items:
+        source = texts.get(key)
+        if isinstance(value, (dict, list, tuple, )):
+            _appendDictItems(item, value, inLevel + 1)
+        elif source is not None and type(source[0]) is type(value) and source[0] == value:
+            item.text = source[1]
+        elif isinstance(value, bool):
+            item.text = "1" if value else "0"
+        elif isinstance(value, float):
+            item.text = formatFloat(value)
+        elif isinstance(value, int):
+            item.text = str(value)
+        else:
+            value = str(value)
+            if not value.startswith('"'):
+                value = '"' + value
+            if not value.endswith('"') or len(value) == 1:
+                value += '"'
+            item.text = etree.CDATA(value)
+        item.tail = '\n' + (inLevel + 1) * '\t'
+        inParent.append(item)
+    if item is not None:
+        inParent.text = '\n' + (inLevel + 1) * '\t'
+        item.tail = '\n' + inLevel * '\t'
+
+
+def iterDictCells(inValue, inPrefix=()):
+    """
+    Yields (path, value) pairs of the leaves of a Dictionary value; paths are names and 1-based array indices
+    """
+    if isinstance(inValue, dict):
+        for k, v in inValue.items():
+            yield from iterDictCells(v, inPrefix + (k, ))
+    elif isinstance(inValue, (list, tuple, )):
+        for i, v in enumerate(inValue, 1):
+            yield from iterDictCells(v, inPrefix + (i, ))
+    else:
+        yield inPrefix, inValue
+
+
+_UNSET = object()
+
+
+def _intern(inString):
+    return sys.intern(inString) if inString else inString
+
+
+class ParamFlags(MutableSet):
+    """
+    Set-like view of a param's flags, which are stored as a bitmask (1 << PARFLG_*) in Param._flags
+    par.flags.add(PARFLG_CHILD), PARFLG_CHILD in par.flags, par.flags |= {...} etc. change the param itself
+    """
+    __slots__ = ("_param", )
+
+    def __init__(self, inParam):
+        self._param = inParam
+
+    @staticmethod
+    def toBits(inFlags):
+        if isinstance(inFlags, ParamFlags):
+            return inFlags._param._flags
+        if isinstance(inFlags, int):
+            return inFlags
+        bits = 0
+        for f in inFlags:
+            bits |= 1 << f
+        return bits
+
+    def __contains__(self, item):
+        return isinstance(item, int) and item >= 0 and bool(self._param._flags >> item & 1)
+
+    def __iter__(self):
+        bits = self._param._flags
+        f = 0
+        while bits:
+            if bits & 1:
+                yield f
+            bits >>= 1
+            f += 1
+
+    def __len__(self):
+        return bin(self._param._flags).count("1")
+
+    def __bool__(self):
+        return bool(self._param._flags)
+
+    def add(self, value):
+        self._param._flags |= 1 << value
+
+    def discard(self, value):
+        if value in self:
+            self._param._flags &= ~(1 << value)
+
+    def clear(self):
+        self._param._flags = 0
+
+    def __repr__(self):
+        return "ParamFlags(%r)" % set(self)
 
 
 class Param(object):
-    tagBackList = ["", "Length", "Angle", "RealNum", "Integer", "Boolean", "String", "Material",
-                   "LineType", "FillPattern", "PenColor", "Separator", "Title", "LightSwitch", "ColorRGB", "Intensity", "BuildingMaterial", "Profile", "Dictionary", "Comment"]
+    __slots__ = ("__index", "bFix", "bLazy", "iType", "name", "desc", "value", "_flags", "_aVals", "__fd", "__sd",
+                 "text", "tail", "descTail", "flagsTail", "valTail", "aValsTail", "isInherited", "isUsed",
+                 "_eTreeCache", "_eTreeState", "_aValsCache", "_aValsState",
+                 "_sourceETree", "_sourceState", "_sourcePending", "_sourceValue", )
+    _SLOT_NAMES = tuple("_Param" + attr if attr.startswith("__") else attr for attr in __slots__)
+    tagBackList = [PARAM_TAGS.get(iType, "") for iType in range(PAR_COMMENT + 1)]
+    cacheStats = {"eTreeHits": 0, "eTreeMisses": 0, "aValsHits": 0, "aValsMisses": 0, }
+    valueVersion = 0            # Incremented by every value change through setValue etc., for ParamSection's value index
+    bDenseArrays = False       # numeric arrays stored in GDLArray instead of ResizeableGDLDict, if numpy is available
 
     def __init__(self, inETree = None,
                  inType = PAR_UNKNOWN,
@@ -543,14 +1682,22 @@ class Param(object):
                  inUnique=False,
                  inHidden=False,
                  inBold=False,
-                 inFix=False):
+                 inFix=False,
+                 inLazy=False):
+        """
+        :param inLazy:  with inETree: value and array contents are decoded only on first access, and as long as the
+                        param is untouched, eTree gives back a copy of inETree as-is
+        """
         self.__index    = 0
-        self.value      = None
         self.bFix       = inFix
+        self.bLazy      = inLazy
+        self._eTreeCache    = None      # Serialized forms, see eTree and aVals
+        self._aValsCache    = None
 
         if inETree is not None:
             self.eTree = inETree
         else:            # Start from a scratch
+            self.value  = None
             self.iType  = inType
             if inTypeStr:
                 self.iType  = self.getTypeFromString(inTypeStr)
@@ -565,15 +1712,15 @@ class Param(object):
                 self.value = inValue
 
             if self.iType != PAR_COMMENT:
-                self.flags = set()
+                self._flags = 0
                 if inChild:
-                    self.flags |= {PARFLG_CHILD}
+                    self._flags |= 1 << PARFLG_CHILD
                 if inUnique:
-                    self.flags |= {PARFLG_UNIQUE}
+                    self._flags |= 1 << PARFLG_UNIQUE
                 if inHidden:
-                    self.flags |= {PARFLG_HIDDEN}
+                    self._flags |= 1 << PARFLG_HIDDEN
                 if inBold:
-                    self.flags |= {PARFLG_BOLDNAME}
+                    self._flags |= 1 << PARFLG_BOLDNAME
 
             if self.iType not in (PAR_COMMENT, PAR_SEPARATOR, ):
                 self.desc   = inDesc
@@ -600,9 +1747,11 @@ class Param(object):
             return self._aVals[self.__index]
 
     def __getitem__(self, item):
+        # Rows changed in place (par[i][j] = x) are told by the change count of the array, see __cacheState()
         return self._aVals[item]
 
     def __setitem__(self, key, value):
+        self.invalidateCache()
         if isinstance(value, list):
             self._aVals[key] = self._toFormat(value)
             self.__fd = max(self.__fd, key)
@@ -617,6 +1766,128 @@ class Param(object):
     def __repr__(self):
         return self.name
 
+    @property
+    def flags(self):
+        """
+        The PARFLG_* flags as a set-like ParamFlags; params without flags (comments) have no such attribute
+        """
+        self._flags
+        return ParamFlags(self)
+
+    @flags.setter
+    def flags(self, inFlags):
+        self._flags = ParamFlags.toBits(inFlags)
+
+    def __getstate__(self):
+        # Cached lxml elements are neither copied nor pickled; the source element of a lazy param is kept as bytes
+        # Unset slots (the not yet decoded attributes of a lazy param) are left out
+        state = {}
+        for attr in self._SLOT_NAMES:
+            value = self.__getRaw(attr, _UNSET)
+            if value is not _UNSET:
+                state[attr] = value
+        state["_eTreeCache"] = None
+        state["_aValsCache"] = None
+        if state.get("_sourceETree") is not None:
+            state["_sourceETree"] = etree.tostring(state["_sourceETree"], with_tail=False)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state.get("_sourceETree"), bytes):
+            state["_sourceETree"] = etree.fromstring(state["_sourceETree"], etree.XMLParser(strip_cdata=False))
+        for attr, value in state.items():
+            object.__setattr__(self, attr, value)
+
+    def __getRaw(self, inName, inDefault=None):
+        """
+        Attribute without triggering the decoding of a lazy param, inDefault if the slot is not set
+        """
+        try:
+            return object.__getattribute__(self, inName)
+        except AttributeError:
+            return inDefault
+
+    def invalidateCache(self):
+        """
+        Dropping the cached serialized forms; called by the mutators of the param. Changes of name, desc, flags,
+        value etc., and writes into the array's rows (counted by the array) are detected at the next access anyway
+        """
+        self._eTreeCache = None
+        self._aValsCache = None
+
+    @classmethod
+    def resetCacheStats(cls):
+        for k in cls.cacheStats:
+            cls.cacheStats[k] = 0
+
+    def __cacheState(self):
+        return self.name, self.desc, self._flags, self.bFix, self.iType, self.value, self.__aValsChanges()
+
+    def __aValsChanges(self):
+        return self._aVals.changeCount if self._aVals is not None else None
+
+    def __getattr__(self, item):
+        # Only called for missing attributes: the not yet decoded contents of a lazy param
+        if item in self._LAZY_ATTRIBUTES and self.__getRaw("_sourcePending"):
+            self.__decodeSource()
+            return object.__getattribute__(self, item)
+        raise AttributeError(item)
+
+    _LAZY_ATTRIBUTES = ("value", "valTail", "_aVals", "aValsTail", "_Param__fd", "_Param__sd", )
+
+    def __decodeSource(self):
+        """
+        Decoding Value and ArrayValues of the source element of a lazy param
+        Attributes that were set in the meantime are not overwritten
+        """
+        self._sourcePending = False
+        inETree = self._sourceETree
+        if self.__getRaw("value", _UNSET) is _UNSET:
+            val = inETree.find("Value")
+            if val is not None:
+                self.value = self._toFormat(val)
+                self.valTail = _intern(val.tail)
+            else:
+                self.value = None
+                self.valTail = None
+            self._sourceValue = copy.deepcopy(self.value) if self.iType == PAR_DICT else self.value
+        if self.__getRaw("_aVals", _UNSET) is _UNSET:
+            self.aVals = inETree.find("ArrayValues")
+            if self._aVals is not None:
+                # Cells can be changed in place (par[i][j] = x), so an array param can't be copied as-is anymore
+                self._sourceETree = None
+
+    def __wrapSourceCDATA(self):
+        """
+        Putting the texts that are written as CDATA back into CDATA in the source element, for sources parsed
+        with the default, CDATA stripping parser; untouched params are copied out as they would be written
+        """
+        elems = [self._sourceETree.find("Description")]
+        if self.iType in (PAR_STRING, PAR_UNKNOWN, ):
+            elems += self._sourceETree.findall("Value") + self._sourceETree.findall("ArrayValues/AVal")
+        elif self.iType == PAR_DICT:
+            elems += self._sourceETree.findall("Value//String")
+        for elem in elems:
+            if elem is not None and elem.text is not None:
+                elem.text = etree.CDATA(elem.text)
+
+    def __isUntouched(self):
+        """
+        Whether a lazy param still can be written out by copying its source element
+        Once it can't, the rest of the source is decoded and the source element is dropped
+        """
+        if self.__getRaw("_sourceETree") is None:
+            return False
+        value = self.__getRaw("value", _UNSET)
+        if (self.name, self.desc, self._flags, self.bFix, self.iType) != self._sourceState \
+                or value is not _UNSET and value != self.__getRaw("_sourceValue", _UNSET) \
+                or self.__getRaw("_aVals", _UNSET) is not _UNSET and (self.__getRaw("_sourcePending", True) or self._aVals is not None):
+            if self.__getRaw("_sourcePending"):
+                self.__decodeSource()
+            self._sourceETree = None
+            return False
+        return True
+
     def setValue(self, value):
         """
         {
@@ -634,16 +1905,16 @@ class Param(object):
       </Value>
     </Dictionary>
         """
+        self.invalidateCache()
+        Param.valueVersion += 1
         if isinstance(value, list):
             self.aVals = self._toFormat(value)
             if self.value:
                 print(("WARNING: value -> array change: %s" % self.name))
             self.value = None
-        elif isinstance(value, dict):
-            raise NotImplementedError
         else:
             self.value = self._toFormat(value)
-            if self.aVals:
+            if self._aVals:
                 print(("WARNING: array -> value change: %s" % self.name))
             self.aVals = None
 
@@ -667,26 +1938,12 @@ class Param(object):
         elif self.iType in (PAR_SEPARATOR, PAR_TITLE, ):
             return None
         elif self.iType in (PAR_DICT, ):
-            inData = etree.tostring(inData, encoding="utf-8", pretty_print=True).decode("UTF-8")
-            return jsonpickle.dumps(xmltodict.parse(inData))
+            if isinstance(inData, etree._Element):
+                return dictFromETree(inData)
+            return inData
         else:
             return inData
 
-    def _indent(self, elem, level=0):
-        i = "\n" + level * "\t"
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "\t"
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for child in elem:
-                self._indent(child, level + 1)
-            if not elem[-1].tail or not elem[-1].tail.strip():
-                elem[-1].tail = i
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
-
     def _valueToString(self, inVal):
         if self.iType in (PAR_STRING, PAR_UNKNOWN):
             if inVal is not None:
@@ -704,44 +1961,58 @@ class Param(object):
             else:
                 return etree.CDATA('""')
         elif self.iType in (PAR_REAL, PAR_LENGTH, PAR_ANGLE):
-            nDigits = 0
-            eps = 1E-7
-            maxN = 1E12
+            # maxN = 1E12
             # if maxN < abs(inVal) or eps > abs(inVal) > 0:
             #     return "%E" % inVal
             #FIXME 1E-012 and co
             # if -eps < inVal < eps:
             #     return 0
-            s = '%.' + str(nDigits) + 'f'
-            while nDigits < 8:
-                if (inVal - eps < float(s % inVal) < inVal + eps):
-                    break
-                nDigits += 1
-                s = '%.' + str(nDigits) + 'f'
-            return s % inVal
+            return formatFloat(inVal)
         elif self.iType in (PAR_BOOL, ):
             return "0" if not inVal else "1"
         elif self.iType in (PAR_SEPARATOR, ):
             return None
-        elif self.iType in (PAR_DICT,):
-            return self._cdataize(xmltodict.unparse(jsonpickle.loads(inVal), pretty=True, full_document=False))
         else:
             return str(inVal)
 
-    @staticmethod
-    def _cdataize(p_etree):
-        string_elements = p_etree.xpath('//String')
-
-        for element in string_elements:
-            element.text = etree.CDATA(element.text)
-        return p_etree
-
     @property
     def eTree(self):
+        """
+        The param as a newly made lxml element
+        Built once and cached until the param changes, every call gives back a copy of the cached element
+        """
+        return self.__getETree(True)
+
+    def makeETree(self):
+        """
+        Same as eTree but without filling the cache, for writing out whole sections: a still valid cached element
+        is used, otherwise the element is built and given back as-is
+        """
+        return self.__getETree(False)
+
+    def __getETree(self, inCache):
+        if self.__isUntouched():
+            elem = copy.deepcopy(self._sourceETree)
+            elem.tail = '\n' + 2 * '\t'
+            return elem
+        if self.iType >= PAR_COMMENT or self.iType == PAR_DICT:
+            # Dictionary values can be changed in place, so they are not cached
+            return self.__buildETree(inCache)
+        if self._eTreeCache is not None and self._eTreeState == self.__cacheState():
+            self.cacheStats["eTreeHits"] += 1
+        else:
+            self.cacheStats["eTreeMisses"] += 1
+            if not inCache:
+                return self.__buildETree(False)
+            self._eTreeCache = self.__buildETree()
+            self._eTreeState = self.__cacheState()
+        return copy.deepcopy(self._eTreeCache)
+
+    def __buildETree(self, inCache=True):
         if self.iType < PAR_COMMENT:
             tagString = self.tagBackList[self.iType]
             elem = etree.Element(tagString, Name=self.name)
-            nTabs = 3 if self.desc or self.flags is not None or self.value is not None or self.aVals is not None else 2
+            nTabs = 3 if self.desc or self.flags is not None or self.value is not None or self._aVals is not None else 2
             elem.text = '\n' + nTabs * '\t'
 
             desc = etree.Element("Description")
@@ -750,20 +2021,20 @@ class Param(object):
             if not self.desc.endswith('"') or self.desc == '"':
                 self.desc += '"'
             desc.text = etree.CDATA(self.desc)
-            nTabs = 3 if len(self.flags) or self.value is not None or self.aVals is not None or self.bFix else 2
+            nTabs = 3 if self._flags or self.value is not None or self._aVals is not None or self.bFix else 2
             desc.tail = '\n' + nTabs * '\t'
             elem.append(desc)
 
             if self.bFix:
                 #FIXME Fix seems to be a param coming from inheritance
                 fix = etree.Element("Fix")
-                nTabs = 3 if len(self.flags) or self.value is not None or self.aVals is not None else 2
+                nTabs = 3 if self._flags or self.value is not None or self._aVals is not None else 2
                 fix.tail = '\n' + nTabs * '\t'
                 elem.append(fix)
 
-            if self.flags:
+            if self._flags:
                 flags = etree.Element("Flags")
-                nTabs = 3 if self.value is not None or self.aVals is not None else 2
+                nTabs = 3 if self.value is not None or self._aVals is not None else 2
                 flags.tail = '\n' + nTabs * '\t'
                 flags.text = '\n' + 4 * '\t'
                 elem.append(flags)
@@ -778,20 +2049,15 @@ class Param(object):
                     flags.append(element)
 
             if self.iType == PAR_DICT:
-                _dict = jsonpickle.loads(self.value)
-                _xml = xmltodict.unparse(_dict, full_document=False)
-                value = self._cdataize(etree.XML(_xml))
-                self._indent(value, 3)
-                value.tail = value.tail[:-1]
-                elem.append(value)
-            elif self.value is not None or (self.iType == PAR_STRING and self.aVals is None):
+                elem.append(dictToETree(self.value or {}))
+            elif self.value is not None or (self.iType == PAR_STRING and self._aVals is None):
                 #FIXME above line why string?
                 value = etree.Element("Value")
                 value.text = self._valueToString(self.value)
                 value.tail = '\n' + 2 * '\t'
                 elem.append(value)
-            elif self.aVals is not None:
-                elem.append(self.aVals)
+            elif self._aVals is not None:
+                elem.append(self.aVals if inCache else self.__makeAVals())
             elem.tail = '\n' + 2 * '\t'
         else:
             elem = etree.Comment(self.name)
@@ -800,38 +2066,55 @@ class Param(object):
 
     @eTree.setter
     def eTree(self, inETree):
-        self.text = inETree.text
-        self.tail = inETree.tail
+        self.invalidateCache()
+        if self.__getRaw("iType", _UNSET) is not _UNSET:
+            # Only a change of an existing param; new params are indexed when they are added to a section
+            Param.valueVersion += 1
+        # Whitespace is the same in most params, so only one copy of it is kept
+        self.text = _intern(inETree.text)
+        self.tail = _intern(inETree.tail)
         if not isinstance(inETree, etree._Comment):
-            self.flags = set()
+            self._flags = 0
             self.iType = self.getTypeFromString(inETree.tag)
             if self.iType == PAR_UNKNOWN:
                 self.tagBackList[self.iType] = inETree.tag
 
             self.name       = inETree.attrib["Name"]
             self.desc       = inETree.find("Description").text
-            self.descTail   = inETree.find("Description").tail
-
-            val = inETree.find("Value")
-            if val is not None:
-                self.value = self._toFormat(val)
-                self.valTail = val.tail
-            else:
-                self.value = None
-                self.valTail = None
-
-            self.aVals = inETree.find("ArrayValues")
+            self.descTail   = _intern(inETree.find("Description").tail)
 
             if inETree.find("Fix") is not None:
                 self.bFix = True
 
             if inETree.find("Flags") is not None:
-                self.flagsTail = inETree.find("Flags").tail
+                self.flagsTail = _intern(inETree.find("Flags").tail)
                 for f in inETree.find("Flags"):
-                    if f.tag == "ParFlg_Child":     self.flags |= {PARFLG_CHILD}
-                    if f.tag == "ParFlg_Unique":    self.flags |= {PARFLG_UNIQUE}
-                    if f.tag == "ParFlg_Hidden":    self.flags |= {PARFLG_HIDDEN}
-                    if f.tag == "ParFlg_BoldName":  self.flags |= {PARFLG_BOLDNAME}
+                    if f.tag == "ParFlg_Child":     self._flags |= 1 << PARFLG_CHILD
+                    if f.tag == "ParFlg_Unique":    self._flags |= 1 << PARFLG_UNIQUE
+                    if f.tag == "ParFlg_Hidden":    self._flags |= 1 << PARFLG_HIDDEN
+                    if f.tag == "ParFlg_BoldName":  self._flags |= 1 << PARFLG_BOLDNAME
+
+            if self.bLazy:
+                for attr in self._LAZY_ATTRIBUTES:
+                    try:
+                        object.__delattr__(self, attr)
+                    except AttributeError:
+                        pass
+                # A detached copy, so that the param doesn't keep the whole source document alive
+                self._sourceETree   = copy.deepcopy(inETree)
+                self.__wrapSourceCDATA()
+                self._sourceState   = (self.name, self.desc, self._flags, self.bFix, self.iType)
+                self._sourcePending = True
+            else:
+                val = inETree.find("Value")
+                if val is not None:
+                    self.value = self._toFormat(val)
+                    self.valTail = _intern(val.tail)
+                else:
+                    self.value = None
+                    self.valTail = None
+
+                self.aVals = inETree.find("ArrayValues")
 
         else:  # _Comment
             self.iType = PAR_COMMENT
@@ -842,6 +2125,32 @@ class Param(object):
 
     @property
     def aVals(self):
+        """
+        Array contents as a newly made ArrayValues element, cached like eTree
+        """
+        if self._aVals is None:
+            return None
+        if self._aValsCache is not None and self._aValsState == self.__aValsChanges():
+            self.cacheStats["aValsHits"] += 1
+        else:
+            self.cacheStats["aValsMisses"] += 1
+            self._aValsCache = self.__buildAVals()
+            self._aValsState = self.__aValsChanges()
+        return copy.deepcopy(self._aValsCache)
+
+    def __makeAVals(self):
+        """
+        aVals without filling the cache, see makeETree()
+        """
+        if self._aValsCache is not None and self._aValsState == self.__aValsChanges():
+            self.cacheStats["aValsHits"] += 1
+            return copy.deepcopy(self._aValsCache)
+        self.cacheStats["aValsMisses"] += 1
+        return self.__buildAVals()
+
+    def __buildAVals(self):
+        if isinstance(self._aVals, GDLArray):
+            return self._aVals.toETree(formatFloats)
         if self._aVals is not None:
             # maxVal = max([self._aVals[avk].size if isinstance(self._aVals[avk], list) else 0 for avk in list(self._aVals.keys())])
             # aValue = etree.Element("ArrayValues", FirstDimension=str(self._aVals.size), SecondDimension=str(maxVal if maxVal>1 else 0))
@@ -851,32 +2160,36 @@ class Param(object):
         aValue.text = '\n' + 4 * '\t'
         aValue.tail = '\n' + 2 * '\t'
 
+        cells = []
         for _i, rowIdx in enumerate(self._aVals):
             row = self._aVals[rowIdx]
             if self.__sd:
                 for _j, colIdx in enumerate(row):
-                    cell = row[colIdx]
-                    arrayValue = etree.Element("AVal", Column=str(colIdx), Row=str(rowIdx))
-                    nTabs = 4 #if _j == len(row) and _i == len(self._aVals) else 4
-                    arrayValue.tail = '\n' + nTabs * '\t'
-                    aValue.append(arrayValue)
-                    arrayValue.text = self._valueToString(cell)
+                    cells.append((etree.Element("AVal", Column=str(colIdx), Row=str(rowIdx)), row[colIdx]))
             else:
-                cell = row
-                arrayValue = etree.Element("AVal", Row=str(rowIdx))
-                nTabs = 4  # if _i == len(self._aVals) - 1 else 4
-                arrayValue.tail = '\n' + nTabs * '\t'
-                aValue.append(arrayValue)
-                arrayValue.text = self._valueToString(cell)
+                cells.append((etree.Element("AVal", Row=str(rowIdx)), row))
+
+        if self.iType in (PAR_REAL, PAR_LENGTH, PAR_ANGLE):
+            texts = formatFloatList([cell for _, cell in cells])
+        else:
+            texts = [self._valueToString(cell) for _, cell in cells]
+        for (arrayValue, _), text in zip(cells, texts):
+            nTabs = 4  # if _i == len(self._aVals) - 1 else 4
+            arrayValue.tail = '\n' + nTabs * '\t'
+            arrayValue.text = text
+            aValue.append(arrayValue)
         arrayValue.tail = '\n\t\t\t'
         return aValue
 
     @aVals.setter
     def aVals(self, inValues):
+        self.invalidateCache()
         if isinstance(inValues, etree._Element):
             self.__fd = int(inValues.attrib["FirstDimension"])
             self.__sd = int(inValues.attrib["SecondDimension"])
-            if self.__sd > 0:
+            if self.__denseKind():
+                self._aVals = GDLArray.fromETree(self.__denseKind(), inValues)
+            elif self.__sd > 0:
                 self._aVals = ResizeableGDLDict()
                 for v in inValues.iter("AVal"):
                     x = int(v.attrib["Column"])
@@ -887,63 +2200,234 @@ class Param(object):
                 for v in inValues.iter("AVal"):
                     y = int(v.attrib["Row"])
                     self._aVals[y] = self._toFormat(v.text)
-            self.aValsTail = inValues.tail
+            self.aValsTail = _intern(inValues.tail)
         elif isinstance(inValues, list):
             self.__fd = len(inValues)
             self.__sd = len(inValues[0]) if isinstance(inValues[0], list) and len (inValues[0]) > 1 else 0
 
             _v = list(map(self._toFormat, inValues))
-            self._aVals = ResizeableGDLDict(_v)
+            self._aVals = None
+            if self.__denseKind():
+                self._aVals = GDLArray.fromList(self.__denseKind(), _v, self.__sd)
+            if self._aVals is None:
+                self._aVals = ResizeableGDLDict(_v)
             self.aValsTail = '\n' + 2 * '\t'
         else:
             self._aVals = None
 
-    def getHashableIDs(self, include_name:bool=True):
-        _sep = "."
+    @property
+    def dimensions(self):
+        """
+        (FirstDimension, SecondDimension) of an array param, (0, 0) if it is not an array
+        Read from the GDLArray itself when there is one, as it resizes itself on write
+        """
+        if isinstance(self._aVals, GDLArray):
+            return self._aVals.firstDimension, self._aVals.secondDimension
+        if self._aVals is None:
+            return 0, 0
+        return self.__fd, self.__sd
+
+    def __denseKind(self):
+        """
+        Python type of the values if they are to be stored in a GDLArray, otherwise None
+        """
+        if not self.bDenseArrays or np is None:
+            return None
+        if self.iType in (PAR_LENGTH, PAR_ANGLE, PAR_REAL, ):
+            return float
+        if self.iType in (PAR_INT, PAR_MATERIAL, PAR_LINETYPE, PAR_FILL, PAR_PEN, PAR_BMAT, PAR_PROF, ):
+            return int
+        if self.iType in (PAR_BOOL, ):
+            return bool
+        return None
+
+    def getCellPaths(self, include_name:bool=True):
+        """
+        Addresses of the param's values as tuples: (name, row, column), (name, row) or (name, )
+        """
+        prefix = (self.name, ) if include_name else ()
         if self._aVals:
-            if self.__sd:
-                result = [_sep.join([str(_i + 1), str(_j + 1), ]) for _i in range(self.__fd) for _j in range(self.__sd)]
-            else:
-                result = [str(_i + 1) for _i in range(self.__fd)]
-            if include_name:
-                result = [_sep.join([self.name, _r]) for _r in result]
-            return result
+            fd, sd = self.dimensions
+            if sd:
+                return [prefix + (_i, _j, ) for _i in range(1, fd + 1) for _j in range(1, sd + 1)]
+            return [prefix + (_i, ) for _i in range(1, fd + 1)]
         elif self.iType == PAR_DICT:
-            raise NotImplementedError
+            return [path for path, _ in iterDictCells(self.value or {}, prefix)]
         else:
-            if include_name:
-                return [self.name]
-            else:
-                return []
+            return [prefix] if include_name else []
 
-    def getValueByPath(self, path: str = ""):
-        lPath = path.split(".")
+    def iterCells(self, value=None, predicate=None, include_name:bool=True):
+        """
+        Yields (path, value) pairs of the param's values, straight from the array storage
+        :param value:       only cells equal to this; no filtering if falsy, like getParamIDsByTypeNameAndValue()
+        :param predicate:   only cells for which predicate(cellValue) is true
+        :param include_name: paths start with the param's name, see getCellPaths()
+        """
+        prefix = (self.name, ) if include_name else ()
         if self._aVals:
-            _fd = int(lPath[0])
-            if self.__sd:
-                _sd = int(lPath[1])
-                return self[_fd][_sd]
-            else:
-                return self[_fd]
+            if isinstance(self._aVals, GDLArray) and isinstance(value, (int, float, )):
+                yield from self.__iterDenseCells(prefix, value, predicate)
+                return
+            rows = self._aVals
+            fd, sd = self.dimensions
+            for _i in range(1, fd + 1):
+                row = dict.get(rows, _i) if isinstance(rows, dict) else rows[_i]
+                if sd:
+                    for _j in range(1, sd + 1):
+                        if isinstance(row, dict):
+                            cell = dict.get(row, _j)
+                        else:
+                            cell = row[_j] if row is not None else None
+                        if (not value or cell == value) and (predicate is None or predicate(cell)):
+                            yield prefix + (_i, _j, ), cell
+                elif (not value or row == value) and (predicate is None or predicate(row)):
+                    yield prefix + (_i, ), row
+        elif self.iType == PAR_DICT:
+            for path, cell in iterDictCells(self.value or {}, prefix):
+                if (not value or cell == value) and (predicate is None or predicate(cell)):
+                    yield path, cell
+        elif (not value or self.value == value) and (predicate is None or predicate(self.value)):
+            yield prefix, self.value
+
+    def __iterDenseCells(self, inPrefix, inValue, inPredicate):
+        """
+        iterCells() with a numeric value on a GDLArray: matching cells are found by numpy
+        """
+        data = self._aVals.data
+        if self._aVals.is2D:
+            for _i, _j in zip(*np.nonzero(data == inValue)):
+                cell = data[_i, _j].item()
+                if inPredicate is None or inPredicate(cell):
+                    yield inPrefix + (int(_i) + 1, int(_j) + 1, ), cell
+        else:
+            for _i in np.nonzero(data == inValue)[0]:
+                cell = data[_i].item()
+                if inPredicate is None or inPredicate(cell):
+                    yield inPrefix + (int(_i) + 1, ), cell
+
+    def getValueByCell(self, inPath=()):
+        """
+        :param inPath:  (row, column), (row, ) or () without the param's name; names and 1-based array indices
+                        for dictionaries, like ("contour", "edges", 1, "type")
+        """
+        if self._aVals:
+            if self.dimensions[1]:
+                return self[inPath[0]][inPath[1]]
+            return self[inPath[0]]
         elif self.iType == PAR_DICT:
-            raise NotImplementedError
+            value = self.value
+            for key in inPath:
+                value = value[key - 1] if isinstance(value, list) else value[key]
+            return value
         else:
             return self.value
 
-    def setValueByPath(self, path:str, value):
-        lPath = path.split(".")
+    def setValueByCell(self, inPath, value):
+        """
+        :param inPath:  (row, column), (row, ) or () without the param's name, see getValueByCell()
+                        A new dictionary item is added if the last name of the path is not there yet
+        """
+        self.invalidateCache()
+        Param.valueVersion += 1
         if self._aVals:
-            _fd = int(lPath[0])
-            if self.__sd:
-                _sd = int(lPath[1])
-                self._aVals[_fd][_sd] = value
+            if self.dimensions[1]:
+                self._aVals[inPath[0]][inPath[1]] = value
             else:
-                self._aVals[_fd] = value
-        elif self.iType == PAR_DICT:
-            raise NotImplementedError
+                self._aVals[inPath[0]] = value
+        elif self.iType == PAR_DICT and inPath:
+            parent = self.getValueByCell(inPath[:-1])
+            if isinstance(parent, list):
+                parent[inPath[-1] - 1] = value
+            else:
+                parent[inPath[-1]] = value
         else:
             self.value = value
 
+    def pathToCell(self, inPath:str):
+        """
+        Dotted path like "2.3" -> cell tuple (2, 3), "contour.edges.1" -> ("contour", "edges", 1)
+        Only the segments that index an array are converted to int: all of them for array params, and for dictionaries
+        those addressing a list, so that dictionary keys like "2024" stay strings
+        """
+        segments = [_p for _p in inPath.split(".") if _p]
+        if self._aVals:
+            return tuple(int(_p) for _p in segments)
+        result = []
+        value = self.value if self.iType == PAR_DICT else None
+        for segment in segments:
+            if isinstance(value, list) and segment.isdigit():
+                key = int(segment)
+                value = value[key - 1] if 0 < key <= len(value) else None
+            else:
+                key = segment
+                value = value.get(key) if isinstance(value, dict) else None
+            result.append(key)
+        return tuple(result)
+
+    def diff(self, inOther):
+        """
+        Differences from this param to inOther, regardless of their names
+        :return:    list of ParamChange of kind TYPE, DESC, FLAGS, VALUE or CELLS
+        """
+        result = []
+        if self.iType != inOther.iType:
+            result.append(ParamChange(ParamChange.TYPE, inOther.name, self.iType, inOther.iType))
+        if PAR_COMMENT in (self.iType, inOther.iType, ):
+            return result
+        if self.desc.strip('"') != inOther.desc.strip('"'):
+            result.append(ParamChange(ParamChange.DESC, inOther.name, self.desc, inOther.desc))
+        if self._flags != inOther._flags:
+            result.append(ParamChange(ParamChange.FLAGS, inOther.name, set(self.flags), set(inOther.flags)))
+        if self._aVals or inOther._aVals or PAR_DICT in (self.iType, inOther.iType, ):
+            cells = self.__diffCells(inOther)
+            if cells:
+                result.append(ParamChange(ParamChange.CELLS, inOther.name, inCells=cells))
+        elif self.value != inOther.value:
+            result.append(ParamChange(ParamChange.VALUE, inOther.name, self.value, inOther.value))
+        return result
+
+    def __diffCells(self, inOther):
+        """
+        [(path, old, new), ...] of the cells that differ, in inOther's order then the removed ones
+        """
+        fd, sd = self.dimensions
+        sameShape = self._aVals and inOther._aVals and (fd, sd) == inOther.dimensions
+        if sameShape and isinstance(self._aVals, GDLArray) and isinstance(inOther._aVals, GDLArray):
+            if sd:
+                old = self._aVals.data[:fd, :sd]
+                new = inOther._aVals.data[:fd, :sd]
+                return [((int(_i) + 1, int(_j) + 1, ), old[_i, _j].item(), new[_i, _j].item())
+                        for _i, _j in zip(*np.nonzero(old != new))]
+            old = self._aVals.data[:fd]
+            new = inOther._aVals.data[:fd]
+            return [((int(_i) + 1, ), old[_i].item(), new[_i].item()) for _i in np.nonzero(old != new)[0]]
+        if sameShape:
+            # Same paths in the same order
+            return [(path, oldCell, newCell) for (path, oldCell), (_, newCell)
+                    in zip(self.iterCells(include_name=False), inOther.iterCells(include_name=False)) if oldCell != newCell]
+        oldCells = dict(self.iterCells(include_name=False))
+        result = []
+        for path, newCell in inOther.iterCells(include_name=False):
+            oldCell = oldCells.pop(path, None)
+            if oldCell != newCell:
+                result.append((path, oldCell, newCell))
+        result.extend((path, oldCell, None) for path, oldCell in oldCells.items())
+        return result
+
+    def getHashableIDs(self, include_name:bool=True):
+        return [".".join(str(_p) for _p in path) for path in self.getCellPaths(include_name)]
+
+    def getValueByPath(self, path: str = ""):
+        if self._aVals or self.iType == PAR_DICT:
+            return self.getValueByCell(self.pathToCell(path))
+        return self.getValueByCell()
+
+    def setValueByPath(self, path:str, value):
+        if self._aVals or self.iType == PAR_DICT:
+            self.setValueByCell(self.pathToCell(path), value)
+        else:
+            self.setValueByCell((), value)
+
 
     class UnknownParameter( BaseException):
         def __init__(self, p_sParName):
@@ -955,42 +2439,8 @@ class Param(object):
 
     @staticmethod
     def getTypeFromString(inString):
-        if inString in ("Length"):
-            return PAR_LENGTH
-        elif inString in ("Angle"):
-            return PAR_ANGLE
-        elif inString in ("RealNum", "Real"):
-            return PAR_REAL
-        elif inString in ("Integer"):
-            return PAR_INT
-        elif inString in ("Boolean"):
-            return PAR_BOOL
-        elif inString in ("String"):
-            return PAR_STRING
-        elif inString in ("Material"):
-            return PAR_MATERIAL
-        elif inString in ("LineType"):
-            return PAR_LINETYPE
-        elif inString in ("FillPattern"):
-            return PAR_FILL
-        elif inString in ("BuildingMaterial"):
-            return PAR_BMAT
-        elif inString in ("Profile"):
-            return PAR_PROF
-        elif inString in ("PenColor"):
-            return PAR_PEN
-        elif inString in ("Separator"):
-            return PAR_SEPARATOR
-        elif inString in ("Title"):
-            return PAR_TITLE
-        elif inString in ("LightSwitch"):
-            return PAR_LIGHTSW
-        elif inString in ("ColorRGB"):
-            return PAR_COLORRGB
-        elif inString in ("Intensity"):
-            return PAR_INTENSITY
-        elif inString in ("Dictionary"):
-            return PAR_DICT
-        else:
-            return PAR_UNKNOWN
+        """
+        Param type of an xml tag like "Length", PAR_UNKNOWN if not known
+        """
+        return TAG_PARAM_TYPES.get(inString, PAR_UNKNOWN)
 
@@ -1,8 +1,121 @@
 import os
+import io
+import mmap
 import uuid
+import multiprocessing
+import hashlib
+import pickle
+import struct
+import tempfile
+import time
+import threading
+import shutil
+import zlib
+import itertools
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 from GSMParamLib import *
-import copy
+
+
+# GDL tokens: comments, strings and numbers are matched only to be skipped, group 1 is an identifier
+_GDL_TOKENS = re.compile(r"""!.*|"[^"\n]*"?|'[^'\n]*'?|`[^`\n]*`?|´[^´\n]*´?|“[^”\n]*”?|‘[^’\n]*’?"""
+                         r"""|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?|([A-Za-z_~][A-Za-z0-9_~]*)""")
+
+
+def getGDLIdentifiers(script:str)->set:
+    """
+    Identifiers used in a GDL script, uppercased as GDL is case insensitive; comments and strings are skipped
+    """
+    if not script:
+        return set()
+    result = set(_GDL_TOKENS.findall(script.upper()))
+    result.discard('')
+    return result
+
+
+def writeFileAtomic(path:str, data):
+    """
+    Writing to a temp file in the target's directory then renaming it, so that readers never see a partial file
+    :param data:    bytes, or a binary file object to be copied
+    """
+    fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
+        os.replace(tempPath, path)
+    except BaseException:
+        try:
+            os.remove(tempPath)
+        except OSError:
+            pass
+        raise
+
+
+_parsers = threading.local()
+
+
+def getXMLParser()->etree.XMLParser:
+    """
+    The parser of the calling thread, made once and reused: CDATA sections are kept and huge text nodes
+    (long scripts, embedded pictures) are allowed
+    lxml parsers must not be used by several threads at once, hence one per thread
+    """
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = etree.XMLParser(strip_cdata=False, huge_tree=True)
+    return parser
+
+
+def parseXMLFile(path:str, memory_map:bool=True)->etree._ElementTree:
+    """
+    Parsing an xml file with getXMLParser()
+    :param memory_map:  the file is memory-mapped and the parser reads the mapped buffer directly, without reading
+                        it into a bytes object first; otherwise lxml reads the file by path
+    """
+    if memory_map:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    return etree.fromstring(buffer, getXMLParser(), base_url=path).getroottree()
+    # Empty files are left to etree.parse() to raise the usual XMLSyntaxError
+    return etree.parse(path, getXMLParser())
+
+
+class LibraryContext(object):
+    """
+    Registries and directories of one library
+    The class-level registries (SourceXML.replacement_dict, DestXML.id_dict etc.) are those of the default context,
+    LibraryContext.default; further contexts let several libraries be loaded and converted side by side
+    """
+    default = None     # The context working on the class attributes, see _ClassLevelContext
+
+    def __init__(self, source_xml_dir:str= '', dest_xml_dir:str= '', source_resource_dir:str= ''):
+        self.sSourceXMLDir      = source_xml_dir
+        self.sDestXMLDir        = dest_xml_dir
+        self.sSourceResourceDir = source_resource_dir
+        self.source_guids       = {}        # Source GUID     -> Source XMLs, idx by
+        self.replacement_dict   = {}        # source filename -> SourceXMLs
+        self.all_keywords       = set()
+        self.source_pict_dict   = {}
+        self.dest_sourcenames   = set()     # source name     -> DestXMLs, idx by original filename
+        self.id_dict            = {}        # Source GUID     -> dest GUID
+        self.dest_dict          = {}        # dest name       -> DestXML
+        self.pict_dict          = {}
+        self.callGraph          = None      # MacroCallGraph of replacement_dict, see SourceXML.getCallGraph()
+
+    def clear(self):
+        """
+        Emptying the registries, the directories are kept
+        """
+        for registry in (self.source_guids, self.replacement_dict, self.all_keywords, self.source_pict_dict,
+                         self.dest_sourcenames, self.id_dict, self.dest_dict, self.pict_dict, ):
+            registry.clear()
+        self.callGraph = None
 
 
 class GeneralFile(object) :
@@ -81,14 +194,28 @@ class GeneralFile(object) :
 
     @property
     def basePath(self)->str:
-        if not self.__class__._isBasePathSet:
+        holder = self.__basePathHolder()
+        if holder is self:
+            # Only the file's own one, not the class-level one seen through the instance
+            isBasePathSet = vars(self).get("_isBasePathSet", False)
+        else:
+            isBasePathSet = holder._isBasePathSet
+        if not isBasePathSet:
             raise GeneralFile.BasePathNotSetException("Base Path is not set")
-        return self.__class__._basePath
+        return holder._basePath
 
     @basePath.setter
     def basePath(self, base_path):
-        self.__class__._isBasePathSet = True
-        self.__class__._basePath = base_path
+        holder = self.__basePathHolder()
+        holder._isBasePathSet = True
+        holder._basePath = base_path
+
+    def __basePathHolder(self):
+        # Files of the default context share basePath per class, setting it once sets it for all of them;
+        # files of other LibraryContexts have their own, so that libraries can live side by side
+        if getattr(self, "context", LibraryContext.default) is LibraryContext.default:
+            return self.__class__
+        return self
 
 
 class SourceFile(GeneralFile):
@@ -178,22 +305,27 @@ class SourceResource(ResourceFile, SourceFile):
     source_pict_dict = {}
     sSourceResourceDir = ''
 
-    def __init__(self, rel_path: str, base_path: str= ''):
-        self.basePath = self.sSourceResourceDir
+    def __init__(self, rel_path: str, base_path: str= '', context:LibraryContext=None):
+        self.context = context or LibraryContext.default
+        self.basePath = self.context.sSourceResourceDir
         super().__init__(rel_path)
         self.name = self.fileNameWithExt
         self.isEncodedImage = False
-        self.source_pict_dict[self.name.upper()] = self
+        self.context.source_pict_dict[self.name.upper()] = self
         if not base_path:
-            self.fullPath = os.path.join(self.sSourceResourceDir, rel_path)
+            self.fullPath = os.path.join(self.context.sSourceResourceDir, rel_path)
         else:
             self.fullPath = os.path.join(base_path, rel_path)
 
 
 class DestResource(DestFile, ResourceFile):
     pict_dict = {}
-    def __init__(self, source_file:SourceResource, dest_dir_name:str= '', dest_file_name:str=None, name_from:str = "", name_to:str = "", add_str:bool=False):
-        super().__init__(source_file, self.pict_dict, dest_dir_name, dest_file_name, name_from, name_to, add_str)
+    def __init__(self, source_file:SourceResource, dest_dir_name:str= '', dest_file_name:str=None, name_from:str = "", name_to:str = "", add_str:bool=False, context:LibraryContext=None):
+        """
+        :param context:     the source file's context if None
+        """
+        self.context = context or getattr(source_file, "context", LibraryContext.default)
+        super().__init__(source_file, self.context.pict_dict, dest_dir_name, dest_file_name, name_from, name_to, add_str)
 
     @GeneralFile.name.setter
     def name(self, name:str):
@@ -201,41 +333,383 @@ class DestResource(DestFile, ResourceFile):
         super(DestResource, self.__class__).name.__set__(self, name)
 
 
+class SourceXMLCache(object):
+    """
+    On-disk cache of parsed SourceXML contents, one file per source XML, named after the hash of its path
+    An entry is valid if the source's size and mtime are the same as at storing (and with verify_hash also its
+    contents' hash) or, if only the mtime changed, the hash of its contents is the same
+    Entry format: header (see HEADER), then the zlib compressed pickle of the parsed attributes
+    Least recently used entries are evicted when the cache outgrows size_limit
+    """
+    FORMAT_VERSION  = 3
+    HEADER          = struct.Struct("<4sHBQQ32s")     # magic, format version, lazy params, source size, mtime_ns, blake2b
+    MAGIC           = b"GSMC"
+    EXT             = ".gsmc"
+
+    def __init__(self, cache_dir:str, size_limit:int=256 * 1024 * 1024, verify_hash:bool=False):
+        self.cacheDir   = cache_dir
+        self.sizeLimit  = size_limit
+        self.verifyHash = verify_hash
+        self.__size     = None      # Total size of the entries, counted at the first store
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # Worker processes count the size for themselves
+        state = self.__dict__.copy()
+        state["_SourceXMLCache__size"] = None
+        return state
+
+    def entryPath(self, full_path:str)->str:
+        return os.path.join(self.cacheDir, hashlib.blake2b(os.path.abspath(full_path).encode("utf-8"), digest_size=16).hexdigest() + self.EXT)
+
+    @staticmethod
+    def contentHash(full_path:str)->bytes:
+        with open(full_path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=32).digest()
+
+    def load(self, full_path:str, lazy_params:bool=False):
+        """
+        :return:    dict of the cached attributes, or None if there is no valid entry
+        """
+        entryPath = self.entryPath(full_path)
+        try:
+            with open(entryPath, "rb") as f:
+                data = f.read()
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        if len(data) < self.HEADER.size:
+            return None
+        magic, version, lazy, size, mtime, digest = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.FORMAT_VERSION or bool(lazy) != lazy_params or size != stat.st_size:
+            return None
+        if mtime != stat.st_mtime_ns or self.verifyHash:
+            if self.contentHash(full_path) != digest:
+                return None
+        try:
+            result = pickle.loads(zlib.decompress(data[self.HEADER.size:]))
+        except Exception:
+            return None
+        if mtime != stat.st_mtime_ns:
+            # Same contents, touched file: refreshing the header so that the next load needn't hash again
+            self.store(full_path, result, lazy_params)
+        else:
+            os.utime(entryPath)
+        return result
+
+    def store(self, full_path:str, attributes:dict, lazy_params:bool=False):
+        stat = os.stat(full_path)
+        data = self.HEADER.pack(self.MAGIC, self.FORMAT_VERSION, lazy_params, stat.st_size, stat.st_mtime_ns, self.contentHash(full_path)) \
+               + zlib.compress(pickle.dumps(attributes, pickle.HIGHEST_PROTOCOL))
+        entryPath = self.entryPath(full_path)
+        try:
+            oldSize = os.path.getsize(entryPath)
+        except OSError:
+            oldSize = 0
+        writeFileAtomic(entryPath, data)
+
+        if self.__size is None:
+            self.__size = sum(e.stat().st_size for e in os.scandir(self.cacheDir) if e.name.endswith(self.EXT))
+        else:
+            self.__size += len(data) - oldSize
+        if self.__size > self.sizeLimit:
+            self.trim()
+
+    def trim(self, size_limit:int=None):
+        """
+        Evicting least recently used entries until the cache is under size_limit (self.sizeLimit by default)
+        """
+        if size_limit is None:
+            size_limit = self.sizeLimit
+        entries = []
+        for e in os.scandir(self.cacheDir):
+            if e.name.endswith(self.EXT):
+                try:
+                    entries.append((e.stat().st_mtime_ns, e.stat().st_size, e.path))
+                except OSError:
+                    pass
+        entries.sort()
+        self.__size = sum(e[1] for e in entries)
+        for _, size, path in entries:
+            if self.__size <= size_limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.__size -= size
+
+    def clear(self):
+        self.trim(0)
+
+
+class MacroCallGraph(object):
+    """
+    Call graph of a library from the CalledMacros sections; nodes are the uppercase names of replacement_dict
+    Strongly connected components (recursive macro groups) are found with Tarjan's algorithm, whose output order is
+    also a topological order of the components: called macros come before their callers
+    Transitive closures and the identifiers reachable from a macro are computed once per component and cached
+    """
+    def __init__(self, source_xmls:dict):
+        """
+        :param source_xmls: uppercase name -> SourceXML, like SourceXML.replacement_dict
+        """
+        self.sources = dict(source_xmls)
+        self.edges = {}         # name -> sorted names of the called macros that are in the library
+        for name in sorted(self.sources):
+            called = {m.upper() for m in self.sources[name].calledMacros.values()}
+            self.edges[name] = sorted(called & self.sources.keys())
+
+        self.components = []    # frozensets of names, called macros first
+        self.__componentOf = {} # name -> index in self.components
+        self.__findComponents()
+        self.__closures = None
+        self.__identifiers = None
+
+    def __findComponents(self):
+        # Iterative Tarjan, as call chains can be deeper than the recursion limit
+        index = {}
+        low = {}
+        stack = []
+        onStack = set()
+        for start in self.edges:
+            if start in index:
+                continue
+            index[start] = low[start] = len(index)
+            stack.append(start)
+            onStack.add(start)
+            work = [(start, iter(self.edges[start]))]
+            while work:
+                v, it = work[-1]
+                for w in it:
+                    if w not in index:
+                        index[w] = low[w] = len(index)
+                        stack.append(w)
+                        onStack.add(w)
+                        work.append((w, iter(self.edges[w])))
+                        break
+                    elif w in onStack:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        low[u] = min(low[u], low[v])
+                    if low[v] == index[v]:
+                        component = []
+                        while True:
+                            w = stack.pop()
+                            onStack.discard(w)
+                            component.append(w)
+                            if w == v:
+                                break
+                        for w in component:
+                            self.__componentOf[w] = len(self.components)
+                        self.components.append(frozenset(component))
+
+    def __successors(self, inComponent):
+        i = self.__componentOf[next(iter(inComponent))]
+        return {self.__componentOf[w] for v in inComponent for w in self.edges[v]} - {i}
+
+    def topologicalOrder(self)->list:
+        """
+        Names in dependency order: every macro comes after the macros it calls, except within call cycles
+        """
+        return [name for component in self.components for name in sorted(component)]
+
+    def getCycles(self)->list:
+        """
+        Groups of macros calling each other (recursively or in a cycle)
+        """
+        return [c for c in self.components if len(c) > 1 or any(v in self.edges[v] for v in c)]
+
+    def getClosure(self, name:str, excluded:set=None)->frozenset:
+        """
+        Uppercase names of the macros reachable from name, itself included
+        :param excluded:    uppercase names of macros not to be gone through: neither they nor the macros reachable only
+                            through them are in the result; walked for each call instead of being cached
+        """
+        if excluded:
+            result = {name.upper()}
+            stack = [name.upper()]
+            while stack:
+                for w in self.edges[stack.pop()]:
+                    if w not in result and w not in excluded:
+                        result.add(w)
+                        stack.append(w)
+            return frozenset(result)
+        if self.__closures is None:
+            self.__closures = []
+            for component in self.components:
+                result = set(component)
+                for j in self.__successors(component):
+                    result |= self.__closures[j]
+                self.__closures.append(frozenset(result))
+        return self.__closures[self.__componentOf[name.upper()]]
+
+    def getReachableIdentifiers(self, name:str)->frozenset:
+        """
+        Identifiers of the scripts of name and of all the macros it reaches
+        """
+        if self.__identifiers is None:
+            self.__identifiers = []
+            for component in self.components:
+                result = set()
+                for v in component:
+                    result |= self.sources[v].identifiers
+                for j in self.__successors(component):
+                    result |= self.__identifiers[j]
+                self.__identifiers.append(frozenset(result))
+        return self.__identifiers[self.__componentOf[name.upper()]]
+
+
 class SourceXML (XMLFile, SourceFile):
     source_guids     = {}   # Source GUID     -> Source XMLs, idx by
     replacement_dict = {}   # source filename -> SourceXMLs
     sSourceXMLDir    = ''
+    bLazyParams      = False    # Param values decoded only when accessed, untouched params written out as they were
+    cache            = None     # SourceXMLCache, parsed contents are cached there if set
+    bHeaderOnly      = False    # Only the header fields are scanned at init, see _DEFERRED_ATTRIBUTES
 
-    def __init__(self, rel_path:str):
-        self.basePath = self.sSourceXMLDir
+    _CACHED_ATTRIBUTES = ("iVersion", "ID", "guid", "bPlaceable", "parentSubTypes", "calledMacros", "gdlPicts",
+                          "parameters", "scripts", "keywords", "prevPict", )
+    _HEADER_ATTRIBUTES = ("iVersion", "ID", "guid", "bPlaceable", "parentSubTypes", "calledMacros", )
+    _DEFERRED_ATTRIBUTES = ("gdlPicts", "parameters", "scripts", "keywords", "prevPict", )     # Loaded at first access in header-only mode
+    _HEADER_TAGS = ("Ancestry", "CalledMacros", )     # Top-level elements before ParamSection and the scripts
+
+    def __init__(self, rel_path:str, register:bool=True, header_only:bool=None, context:LibraryContext=None):
+        """
+        :param register:    adding the file to the registries of its context (source_guids, replacement_dict,
+                            all_keywords), see register()
+        :param header_only: scanning only the header fields, the rest is loaded at first access; bHeaderOnly if None
+        :param context:     the library of the file, LibraryContext.default (the class-level registries) if None
+        """
+        self.context = context or LibraryContext.default
+        self.basePath = self.context.sSourceXMLDir
         super().__init__(rel_path)
+        if header_only is None:
+            header_only = self.bHeaderOnly
+
+        cached = self.cache.load(self.fullPath, self.bLazyParams) if self.cache is not None else None
+        if cached is not None:
+            self.__dict__.update(cached)
+        elif header_only:
+            del self.gdlPicts
+            del self.prevPict
+            self._bDeferred = True
+            self.__scanHeader()
+        else:
+            self.__load()
+
+        if register:
+            self.register()
+
+    def __getstate__(self):
+        # The context with all its registries isn't copied along, see loadLibrary()
+        state = self.__dict__.copy()
+        state.pop("context", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.context = LibraryContext.default
+
+    def __getattr__(self, item):
+        # Only called for missing attributes: the not yet loaded ones of a header-only SourceXML
+        if item in self._DEFERRED_ATTRIBUTES and self.__dict__.get("_bDeferred"):
+            self.__loadDeferred()
+            return object.__getattribute__(self, item)
+        raise AttributeError(item)
+
+    def __loadDeferred(self):
+        """
+        Full load of a header-only SourceXML; header fields changed in the meantime are kept
+        """
+        self._bDeferred = False
+        header = {a: self.__dict__[a] for a in self._HEADER_ATTRIBUTES}
+        self.__load()
+        self.__dict__.update(header)
+        if self.__dict__.get("_bRegistered") and self.keywords is not None:
+            self.context.all_keywords |= set(self.keywords)
+
+    def __load(self):
+        self.__parse()
+        if self.cache is not None:
+            self.cache.store(self.fullPath, {a: getattr(self, a) for a in self._CACHED_ATTRIBUTES}, self.bLazyParams)
+
+    def __scanHeader(self):
+        """
+        Streaming scan of the header fields, without building the tree of parameters and scripts;
+        stops at the start of the first section after the header (ParamSection or a script)
+        """
         self.calledMacros   = {}
         self.parentSubTypes = []
-        self.scripts        = {}
 
-        mroot = etree.parse(self.fullPath, etree.XMLParser(strip_cdata=False))
-        self.iVersion = int(mroot.getroot().attrib['Version'])
+        depth = 0
+        root = None
+        for event, elem in etree.iterparse(self.fullPath, events=("start", "end", ), huge_tree=True):
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = elem
+                    self.__readRoot(elem)
+                elif depth == 2 and elem.tag not in self._HEADER_TAGS:
+                    break
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if elem.tag == "Ancestry":
+                self.__readAncestry(elem)
+            elif elem.tag == "CalledMacros":
+                for m in elem.iterchildren("Macro"):
+                    self.__readCalledMacro(m)
+            # Dropping the finished top-level sections
+            root.remove(elem)
+
+    def __readRoot(self, inRoot):
+        self.iVersion = int(inRoot.attrib['Version'])
 
         if self.iVersion <= AC_18:
             self.ID = 'UNID'
         else:
             self.ID = 'MainGUID'
-        self.guid = mroot.getroot().attrib[self.ID]
+        self.guid = inRoot.attrib[self.ID]
 
-        if mroot.getroot().attrib['IsPlaceable'] == 'no':
+        if inRoot.attrib['IsPlaceable'] == 'no':
             self.bPlaceable = False
         else:
             self.bPlaceable = True
 
+    def __readAncestry(self, inAncestry):
+        for ancestryID in inAncestry.findall(self.ID):
+            self.parentSubTypes += [ancestryID.text]
+
+    def __readCalledMacro(self, inMacro):
+        calledMacroID = inMacro.find(self.ID).text
+        self.calledMacros[calledMacroID] = inMacro.find("MName").text.strip( "'" + '"')
+
+    def __readPicture(self, inPicture):
+        if "path" in inPicture.attrib:
+            self.prevPict = inPicture.attrib["path"]
+
+    def __parse(self):
+        self.calledMacros   = {}
+        self.parentSubTypes = []
+        self.scripts        = {}
+        self.gdlPicts       = []
+        self.prevPict       = ''
+
+        mroot = parseXMLFile(self.fullPath)
+        self.__readRoot(mroot.getroot())
+
         #Filtering params in source in place of dest cos it's feasible and in dest later added params are unused
 
         for a in mroot.findall("./Ancestry"):
-            for ancestryID in a.findall(self.ID):
-                self.parentSubTypes += [ancestryID.text]
+            self.__readAncestry(a)
 
         for m in mroot.findall("./CalledMacros/Macro"):
-            calledMacroID = m.find(self.ID).text
-            self.calledMacros[calledMacroID] = m.find("MName").text.strip( "'" + '"')
+            self.__readCalledMacro(m)
 
         for gdlPict in mroot.findall("./GDLPict"):
             if 'path' in gdlPict.attrib:
@@ -243,7 +717,7 @@ class SourceXML (XMLFile, SourceFile):
                 self.gdlPicts += [_path.upper()]
 
         # Parameter manipulation: checking usage and later add custom pars
-        self.parameters = ParamSection(mroot.find("./ParamSection"))
+        self.parameters = ParamSection(mroot.find("./ParamSection"), inLazy=self.bLazyParams)
 
         for scriptName in SCRIPT_NAMES_LIST:
             script = mroot.find("./%s" % scriptName)
@@ -254,38 +728,134 @@ class SourceXML (XMLFile, SourceFile):
         if k is not None:
             t = re.sub("\n", ", ", k.text)
             self.keywords = [kw.strip() for kw in t.split(",") if kw != ''][1:-1]
-            XMLFile.all_keywords |= set(self.keywords)
         else:
             self.keywords = None
 
-        if self.guid.upper() not in self.source_guids:
-            self.source_guids[self.guid.upper()] = self.name
-
         pic = mroot.find("./Picture")
         if pic is not None:
-            if "path" in pic.attrib:
-                self.prevPict = pic.attrib["path"]
+            self.__readPicture(pic)
+
+    def register(self):
+        """
+        Adding the file to the registries of its context; the first file with a GUID and the last one with a name wins
+        """
+        context = self.context
+        # Keywords of a header-only SourceXML are added when it is fully loaded
+        self._bRegistered = True
+        if not self.__dict__.get("_bDeferred") and self.keywords is not None:
+            context.all_keywords |= set(self.keywords)
+
+        if self.guid.upper() not in context.source_guids:
+            context.source_guids[self.guid.upper()] = self.name
 
-        self.replacement_dict[self.name.upper()] = self
+        context.replacement_dict[self.name.upper()] = self
+        context.callGraph = None
 
-    def checkParameterUsage(self, par, macro_set)->bool:
+    @staticmethod
+    def getCallGraph(context:LibraryContext=None)->MacroCallGraph:
+        """
+        Call graph of the registered files of context (the default one if None), rebuilt after new registrations
+        Call invalidateCallGraph() after changing replacement_dict or calledMacros directly
+        """
+        context = context or LibraryContext.default
+        if context.callGraph is None or context.callGraph.sources.keys() != context.replacement_dict.keys():
+            context.callGraph = MacroCallGraph(context.replacement_dict)
+        return context.callGraph
+
+    @staticmethod
+    def invalidateCallGraph(context:LibraryContext=None):
+        (context or LibraryContext.default).callGraph = None
+
+    @classmethod
+    def loadLibrary(cls, rel_paths:list, processes:int=None, chunk_size:int=16, context:LibraryContext=None)->list:
+        """
+        Loading many source XMLs, parsed in a pool of worker processes
+        The results are registered in the parent in the order of rel_paths, so the registries are the same as with
+        loading the files one by one
+        :param rel_paths:   relative paths under the context's sSourceXMLDir
+        :param processes:   number of worker processes, os.cpu_count() if None; 1 loads in this process
+        :param context:     the library to load into, LibraryContext.default if None
+        :return:            SourceXMLs in the order of rel_paths
+        """
+        context = context or LibraryContext.default
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes <= 1 or len(rel_paths) <= 1:
+            return [cls(rel_path, context=context) for rel_path in rel_paths]
+
+        jobs = [(cls, context.sSourceXMLDir, cls.bLazyParams, cls.bHeaderOnly, cls.cache, rel_path) for rel_path in rel_paths]
+        with multiprocessing.Pool(processes) as pool:
+            result = pool.map(_loadSourceXML, jobs, chunksize=chunk_size)
+        for sourceXML in result:
+            sourceXML.context = context
+            sourceXML.register()
+        return result
+
+    @property
+    def identifiers(self)->frozenset:
+        """
+        GDL identifiers of all the scripts, uppercased; tokenized at first access
+        """
+        if self.__dict__.get("_identifiers") is None:
+            result = set()
+            for script in self.scripts.values():
+                result |= getGDLIdentifiers(script)
+            self._identifiers = frozenset(result)
+        return self._identifiers
+
+    def checkParameterUsage(self, par, macro_set=None)->bool:
         """
         Checking whether a certain Parameter is used in the macro or any of its called macros
         :param par:       Parameter
-        :param macro_set:  set of macros that the parameter was searched in before
+        :param macro_set:  set of macros not to be searched in, e.g. because they were searched before; the macros
+                           called only through them are not searched either
         :return:        boolean
         """
         #FIXME check parameter passings: a called macro without PARAMETERS ALL
-        for script in self.scripts:
-            if par.name in script:
-                return True
+        name = par.name.upper()
+        if name in self.identifiers:
+            return True
+        if self.name.upper() not in self.context.replacement_dict:
+            return False
+
+        graph = self.getCallGraph(self.context)
+        if not macro_set:
+            return name in graph.getReachableIdentifiers(self.name)
+        excluded = {m.upper() for m in macro_set}
+        return any(name in graph.sources[macro].identifiers for macro in graph.getClosure(self.name, excluded))
+
+    def getReachableIdentifiers(self)->frozenset:
+        """
+        Identifiers of the scripts of this file and of all macros called from it, directly or indirectly
+        """
+        if self.name.upper() not in self.context.replacement_dict:
+            return self.identifiers
+        return self.getCallGraph(self.context).getReachableIdentifiers(self.name)
+
+    @staticmethod
+    def getParameterUsage(context:LibraryContext=None)->dict:
+        """
+        Which params are used where, for every registered SourceXML of context: one set lookup per param
+        :return:    source name -> set of names of its params used in its scripts or its called macros
+        """
+        result = {}
+        for sourceXML in (context or LibraryContext.default).replacement_dict.values():
+            identifiers = sourceXML.getReachableIdentifiers()
+            result[sourceXML.name] = {par.name for par in sourceXML.parameters.iterParams()
+                                      if par.iType != PAR_COMMENT and par.name.upper() in identifiers}
+        return result
 
-        for _, macroName in self.calledMacros.items():
-            if macroName in self.replacement_dict:
-                if macroName not in macro_set:
-                    if self.replacement_dict[macroName].checkParameterUsage(par, macro_set):
-                        return True
-        return False
+
+def _loadSourceXML(job):
+    """
+    Worker of SourceXML.loadLibrary(): class-level settings are passed explicitly as spawned workers don't inherit them
+    The file is loaded in a throwaway context, the parent puts it into the real one
+    """
+    sourceClass, sourceDir, bLazyParams, bHeaderOnly, cache, rel_path = job
+    sourceClass.bLazyParams = bLazyParams
+    sourceClass.bHeaderOnly = bHeaderOnly
+    sourceClass.cache = cache
+    return sourceClass(rel_path, register=False, context=LibraryContext(source_xml_dir=sourceDir))
 
 
 class DestXML (DestFile, XMLFile):
@@ -295,7 +865,7 @@ class DestXML (DestFile, XMLFile):
     sDestXMLDir          = ''
     bOverWrite           = False
 
-    def __init__(self, source_file:SourceXML, dest_file_name:str=None, name_from:str = "", name_to:str = "", add_str:bool=False, new_guid:bool=True):
+    def __init__(self, source_file:SourceXML, dest_file_name:str=None, name_from:str = "", name_to:str = "", add_str:bool=False, new_guid:bool=True, context:LibraryContext=None):
         """
         Initializes an instance of the class.
 
@@ -305,8 +875,10 @@ class DestXML (DestFile, XMLFile):
             name_to (str, optional):
             dest_file_name (str, optional): The name of the destination file, if completely new
             add_str (bool, optional): Flag indicating whether to add a string.
+            context (LibraryContext, optional): The library of the file, the source file's one if None
         """
-        super().__init__(source_file, self.dest_dict, self.sDestXMLDir, dest_file_name, name_from, name_to, add_str)
+        self.context = context or source_file.context
+        super().__init__(source_file, self.context.dest_dict, self.context.sDestXMLDir, dest_file_name, name_from, name_to, add_str)
 
         self.guid                   = source_file.guid if not new_guid else str(uuid.uuid4()).upper()
         self.bPlaceable             = source_file.bPlaceable
@@ -314,20 +886,397 @@ class DestXML (DestFile, XMLFile):
         self.bRetainCalledMacros    = False
         self.warnings               = []
 
-        self.parameters             = copy.deepcopy(source_file.parameters)
+        self.parameters             = source_file.parameters.copyOnWrite()
 
         if os.path.isfile(self.fullPath):
             #for overwriting existing xmls while retaining GUIDs etc
             if self.bOverWrite:
                 self.bRetainCalledMacros    = True
-                mdp = etree.parse(self.fullPath, etree.XMLParser(strip_cdata=False))
+                mdp = parseXMLFile(self.fullPath)
                 self.guid = mdp.getroot().attrib[self.sourceFile.ID]
                 print(mdp.getroot().attrib[self.sourceFile.ID])
             else:
                 self.warnings += ["XML Target file exists!"]
 
-        if self.sourceFile.guid.upper() not in self.id_dict:
-            self.id_dict[self.sourceFile.guid.upper()] = self.guid.upper()
+        if self.sourceFile.guid.upper() not in self.context.id_dict:
+            self.context.id_dict[self.sourceFile.guid.upper()] = self.guid.upper()
+
+        self.context.dest_sourcenames.add(self.sourceFile.name)
+
+    def toBytes(self, id_dict:dict=None)->bytes:
+        """
+        The destination XML as written by toFile()
+        :param id_dict: source GUID -> dest GUID, the context's id_dict if None
+        """
+        stream = io.BytesIO()
+        self.toFile(stream, id_dict)
+        return stream.getvalue()
+
+    def toFile(self, inFile, id_dict:dict=None):
+        """
+        Streams the destination XML: the source file with the new GUID, parameters and, unless bRetainCalledMacros,
+        the called macros' GUIDs mapped through id_dict
+        The parameters are written by ParamSection.write(), without building their tree
+        :param inFile:  binary file object
+        :param id_dict: source GUID -> dest GUID, the context's id_dict if None
+        """
+        if id_dict is None:
+            id_dict = self.context.id_dict
+        mroot = parseXMLFile(self.sourceFile.fullPath)
+        root = mroot.getroot()
+        root.attrib[self.sourceFile.ID] = self.guid
+        root.attrib['IsPlaceable'] = 'yes' if self.bPlaceable else 'no'
+
+        if not self.bRetainCalledMacros:
+            for m in root.findall("./CalledMacros/Macro/%s" % self.sourceFile.ID):
+                if m.text and m.text.upper() in id_dict:
+                    m.text = id_dict[m.text.upper()]
+
+        with etree.xmlfile(inFile, encoding="UTF-8") as xf:
+            xf.write_declaration()
+            for sibling in reversed(list(root.itersiblings(preceding=True))):
+                xf.write(sibling)
+            with xf.element(root.tag, root.attrib, root.nsmap):
+                if root.text:
+                    xf.write(root.text)
+                for child in root:
+                    if child.tag == "ParamSection":
+                        self.parameters.write(xf)
+                        if child.tail:
+                            xf.write(child.tail)
+                    else:
+                        xf.write(child)
+            for sibling in root.itersiblings():
+                xf.write(sibling)
+
+
+class _ClassAttribute(object):
+    """
+    An attribute of the default context that is a class attribute of a file class
+    """
+    def __init__(self, inClass, inAttribute):
+        self.ownerClass = inClass
+        self.attribute  = inAttribute
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return getattr(self.ownerClass, self.attribute)
+
+    def __set__(self, instance, value):
+        setattr(self.ownerClass, self.attribute, value)
+
+
+class _ClassLevelContext(LibraryContext):
+    """
+    The default context: its registries and directories are the class attributes of the file classes
+    """
+    sSourceXMLDir       = _ClassAttribute(SourceXML, "sSourceXMLDir")
+    sDestXMLDir         = _ClassAttribute(DestXML, "sDestXMLDir")
+    sSourceResourceDir  = _ClassAttribute(SourceResource, "sSourceResourceDir")
+    source_guids        = _ClassAttribute(SourceXML, "source_guids")
+    replacement_dict    = _ClassAttribute(SourceXML, "replacement_dict")
+    all_keywords        = _ClassAttribute(XMLFile, "all_keywords")
+    source_pict_dict    = _ClassAttribute(SourceResource, "source_pict_dict")
+    dest_sourcenames    = _ClassAttribute(DestXML, "dest_sourcenames")
+    id_dict             = _ClassAttribute(DestXML, "id_dict")
+    dest_dict           = _ClassAttribute(DestXML, "dest_dict")
+    pict_dict           = _ClassAttribute(DestResource, "pict_dict")
+
+    def __init__(self):
+        self.callGraph = None
+
+
+LibraryContext.default = _ClassLevelContext()
+
+
+class WriteResult(object):
+    """
+    Outcome of writing one file with BulkWriter
+    """
+    def __init__(self, dest_file, path:str):
+        self.file       = dest_file
+        self.path       = path
+        self.size       = 0
+        self.seconds    = 0.0
+        self.error      = None
+
+    @property
+    def ok(self)->bool:
+        return self.error is None
+
+    def __repr__(self):
+        return "%s %s" % (self.path, "OK" if self.ok else repr(self.error))
+
+
+class BulkWriter(object):
+    """
+    Writing many DestXMLs and DestResources over a bounded thread pool, each file atomically
+    All DestXMLs have to be created before write(), as the id_dicts of their contexts are taken once at its start:
+    every file is written with the same, complete GUID map regardless of the order the threads get to them
+    """
+    def __init__(self, max_workers:int=None, max_pending:int=None, overwrite:bool=None):
+        """
+        :param max_workers: number of threads, min(32, cpu_count + 4) if None
+        :param max_pending: at most this many files are submitted but not yet written, 2 * max_workers if None
+        :param overwrite:   overwriting existing XMLs, DestXML.bOverWrite if None
+        """
+        self.maxWorkers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.maxPending = max_pending or 2 * self.maxWorkers
+        self.overwrite  = overwrite
+        self.stats      = {}
+
+    def write(self, dest_files)->list:
+        """
+        :param dest_files:  DestXMLs and DestResources
+        :return:            WriteResults in the order of dest_files; errors are collected, not raised
+        """
+        results = [WriteResult(f, f.fullPath) for f in dest_files]
+        idDicts = {}    # id(context) -> copy of its id_dict
+        for result in results:
+            context = result.file.context
+            if id(context) not in idDicts:
+                idDicts[id(context)] = dict(context.id_dict)
+        pending = threading.BoundedSemaphore(self.maxPending)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.maxWorkers) as executor:
+            for result in results:
+                pending.acquire()
+                future = executor.submit(self.__writeOne, result, idDicts[id(result.file.context)], self.overwrite)
+                future.add_done_callback(lambda _: pending.release())
+        seconds = time.perf_counter() - start
+
+        size = sum(r.size for r in results if r.ok)
+        self.stats = {"files": len(results),
+                      "errors": sum(1 for r in results if not r.ok),
+                      "bytes": size,
+                      "seconds": seconds,
+                      "filesPerSecond": len(results) / seconds if seconds else 0.0,
+                      "bytesPerSecond": size / seconds if seconds else 0.0, }
+        return results
+
+    @staticmethod
+    def __writeOne(result:WriteResult, id_dict:dict, overwrite:bool):
+        start = time.perf_counter()
+        try:
+            dest = result.file
+            os.makedirs(os.path.dirname(result.path) or ".", exist_ok=True)
+            if isinstance(dest, DestXML):
+                if os.path.isfile(result.path) and not (dest.bOverWrite if overwrite is None else overwrite):
+                    raise FileExistsError(result.path)
+                data = dest.toBytes(id_dict)
+                writeFileAtomic(result.path, data)
+                result.size = len(data)
+            else:
+                with open(dest.sourceFile.fullPath, "rb") as f:
+                    writeFileAtomic(result.path, f)
+                result.size = os.path.getsize(result.path)
+        except Exception as e:
+            result.error = e
+        result.seconds = time.perf_counter() - start
+
+
+class BuildManifest(object):
+    """
+    What each destination file was built from, for rebuilding only the outdated ones on the next run:
+    the content hashes of its source and of all macros the source reaches in the call graph, its GUID, the GUIDs its
+    called macros were mapped to, and a hash of the command-sheet inputs it was made with
+    Stored as JSON, keyed by the absolute path of the destination file
+    Dests are only found up to date if their GUIDs are stable between runs (new_guid=False or bOverWrite)
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, path:str):
+        self.path       = path
+        self.entries    = {}
+        self.__hashes   = {}    # full path -> (size, mtime_ns, hex digest), to hash every source only once
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == self.FORMAT_VERSION:
+                self.entries = data.get("files", {})
+
+    def save(self):
+        writeFileAtomic(self.path, json.dumps({"version": self.FORMAT_VERSION, "files": self.entries}, indent=1, sort_keys=True).encode("utf-8"))
+
+    def __contentHash(self, full_path:str)->str:
+        stat = os.stat(full_path)
+        cached = self.__hashes.get(full_path)
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            cached = (stat.st_size, stat.st_mtime_ns, SourceXMLCache.contentHash(full_path).hex())
+            self.__hashes[full_path] = cached
+        return cached[2]
+
+    @staticmethod
+    def inputsHash(inputs)->str:
+        """
+        :param inputs:  JSON serializable inputs of a destination file, e.g. its command-sheet rows
+        """
+        if inputs is None:
+            return None
+        return hashlib.blake2b(json.dumps(inputs, sort_keys=True, default=repr).encode("utf-8"), digest_size=16).hexdigest()
+
+    def fingerprint(self, dest:'DestXML', inputs=None)->dict:
+        source = dest.sourceFile
+        context = dest.context
+        if source.name.upper() in context.replacement_dict:
+            names = SourceXML.getCallGraph(context).getClosure(source.name)
+        else:
+            names = {source.name.upper()}
+        sources = {}
+        for name in sorted(names):
+            sourceXML = context.replacement_dict.get(name, source)
+            sources[name] = self.__contentHash(sourceXML.fullPath)
+        ids = {guid.upper(): context.id_dict.get(guid.upper()) for guid in source.calledMacros}
+        return {"sources": sources, "guid": dest.guid, "ids": ids, "inputs": self.inputsHash(inputs), }
+
+    def isUpToDate(self, dest:'DestXML', inputs=None)->bool:
+        key = os.path.abspath(dest.fullPath)
+        return key in self.entries and os.path.isfile(key) and self.entries[key] == self.fingerprint(dest, inputs)
+
+    def getStale(self, dests, inputs:dict=None)->list:
+        """
+        :param inputs:  dest -> its inputs, see inputsHash()
+        :return:        the dests that have to be rebuilt, in the order of dests
+        """
+        inputs = inputs or {}
+        return [dest for dest in dests if not self.isUpToDate(dest, inputs.get(dest))]
+
+    def record(self, dest:'DestXML', inputs=None):
+        self.entries[os.path.abspath(dest.fullPath)] = self.fingerprint(dest, inputs)
+
+    def recordResults(self, results, inputs:dict=None):
+        """
+        Recording the successfully written DestXMLs of BulkWriter.write()
+        """
+        inputs = inputs or {}
+        for result in results:
+            if result.ok and isinstance(result.file, DestXML):
+                self.record(result.file, inputs.get(result.file))
+
+
+class GUIDRemapper(object):
+    """
+    Replacing source GUIDs with dest GUIDs (id_dict) in whole files, streamed in chunks
+    Only GUIDs inside the elements of sRemapElements are replaced: Ancestry, CalledMacros and the scripts (references
+    like call statements); the file's own MainGUID, ParamSection, MigrationTable etc. are kept as they are
+    All GUIDs and section tags are matched by one compiled pattern in a single pass over each file's bytes
+    """
+    sRemapElements = ("Ancestry", "CalledMacros", r"Script_\w+", )   # Regular expressions of element names
+    sChunkSize = 1 << 20
+    sMaxTagLength = 256                                             # Of a section tag's name and attributes
+
+    def __init__(self, id_dict:dict):
+        """
+        :param id_dict: source GUID -> dest GUID, uppercase keys like DestXML.id_dict
+        """
+        self.idDict = {k.upper(): v for k, v in id_dict.items() if k.upper() != v.upper()}
+        self.counts = Counter()     # source GUID -> number of replacements, summed over remapFiles() calls
+        self.__pattern = None
+        if self.idDict:
+            alternatives = b"|".join(re.escape(k.encode("ascii")) for k in sorted(self.idDict, key=len, reverse=True))
+            elements = "|".join(self.sRemapElements).encode("ascii")
+            self.__pattern = re.compile(
+                # Opening, closing or empty section tag
+                rb"<(?=[^<>]{1,%d}>)(?P<close>/?)(?:" % self.sMaxTagLength + elements + rb")(?=[\s/>])[^<>]*?(?P<empty>/?)>" +
+                # A GUID, not inside a longer GUID-like token
+                b"|(?<![0-9A-Za-z-])(?P<guid>(?i:" + alternatives + b"))(?![0-9A-Za-z-])")
+            # A match starting before the last overlap bytes of the data read so far is a match of the whole file too:
+            # the longest token and the byte after it are already read
+            self.__overlap = max(max(len(k) for k in self.idDict), self.sMaxTagLength + 2) + 1
+        self.__replacements = {k.encode("ascii"): v.encode("ascii") for k, v in self.idDict.items()}
+
+    def __remapChunks(self, chunks, write)->Counter:
+        """
+        Remapping a stream of bytes
+        :param chunks:  iterable of bytes
+        :param write:   called with the remapped bytes, in order
+        """
+        counts = Counter()
+        if self.__pattern is None:
+            for chunk in chunks:
+                write(chunk)
+            return counts
+
+        depth = 0
+        buffer, start = b"", 0      # buffer[:start] is already written, kept for the lookbehind
+        for chunk in itertools.chain(chunks, (b"", )):
+            buffer = buffer[max(start - 1, 0):] + chunk
+            start = min(start, 1)
+            limit = len(buffer) - self.__overlap if chunk else len(buffer)
+            for match in self.__pattern.finditer(buffer, start):
+                if match.start() >= limit:
+                    break
+                if match.group("guid") is None:
+                    if not match.group("empty"):
+                        depth = max(depth - 1, 0) if match.group("close") else depth + 1
+                elif depth:
+                    key = match.group("guid").upper()
+                    counts[key.decode("ascii")] += 1
+                    write(buffer[start:match.start()])
+                    write(self.__replacements[key])
+                    start = match.end()
+                    continue
+                write(buffer[start:match.end()])
+                start = match.end()
+            if start < limit:
+                write(buffer[start:limit])
+                start = limit
+        return counts
+
+    def remapBytes(self, data:bytes):
+        """
+        :return:    (remapped data, Counter of source GUID -> number of replacements)
+        """
+        result = []
+        counts = self.__remapChunks((data, ), result.append)
+        return b"".join(result), counts
+
+    def remapFile(self, path:str)->Counter:
+        """
+        Remapping a file in place, read in chunks of sChunkSize; written atomically and only if anything changed
+        """
+        with open(path, "rb") as f, tempfile.SpooledTemporaryFile(self.sChunkSize) as result:
+            counts = self.__remapChunks(iter(lambda: f.read(self.sChunkSize), b""), result.write)
+            if counts:
+                result.seek(0)
+                writeFileAtomic(path, result)
+        return counts
+
+    def remapFiles(self, paths:list, processes:int=None)->dict:
+        """
+        Remapping many files, in a pool of worker processes
+        :param processes:   number of worker processes, os.cpu_count() if None; 1 remaps in this process
+        :return:            path -> Counter of replacements, or the exception raised for it; also summed in self.counts
+        """
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes <= 1 or len(paths) <= 1:
+            results = [_remapFile(path, self) for path in paths]
+        else:
+            with multiprocessing.Pool(processes, initializer=_initGUIDRemapper, initargs=(self.idDict, )) as pool:
+                results = pool.map(_remapFile, paths)
+
+        for counts in results:
+            if isinstance(counts, Counter):
+                self.counts.update(counts)
+        return dict(zip(paths, results))
+
+
+_workerRemapper = None
+
+
+def _initGUIDRemapper(id_dict):
+    # Compiling the pattern once per worker process
+    global _workerRemapper
+    _workerRemapper = GUIDRemapper(id_dict)
 
-        self.dest_sourcenames.add(self.sourceFile.name)
 
+def _remapFile(path, remapper=None):
+    try:
+        return (remapper or _workerRemapper).remapFile(path)
+    except Exception as e:
+        return e
@@ -0,0 +1,224 @@
+"""
+Benchmarks of ParamSection internals, run as a script:
+    python bench_ParamSection.py
+"""
+import copy
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from GSMParamLib import ParamList, ParamSection, Param, PAR_INT, PAR_LENGTH
+from lxml import etree
+from test_ParamSection import makeSectionXML
+
+
+def _makeParams(inCount, inPrefix="iPar"):
+    return [Param(inType=PAR_INT, inName="%s%d" % (inPrefix, i), inValue=i) for i in range(inCount)]
+
+
+def _listInsertAfter(inList, inName, inParam):
+    # What ParamSection did before ParamList: rebuilding the name list for every lookup
+    inList.insert([p.name for p in inList].index(inName) + 1, inParam)
+
+
+def benchInserts(inSectionSize, inCommandCount):
+    """
+    Applying inCommandCount insertAfter + get commands to a section of inSectionSize params
+    """
+    anchors = ["iPar%d" % ((i * 7919) % inSectionSize) for i in range(inCommandCount)]
+
+    plainList = _makeParams(inSectionSize)
+    newParams = _makeParams(inCommandCount, "iNew")
+    start = time.perf_counter()
+    for anchor, par in zip(anchors, newParams):
+        _listInsertAfter(plainList, anchor, par)
+        plainList[[p.name for p in plainList].index(anchor)]
+    tList = time.perf_counter() - start
+
+    paramList = ParamList(_makeParams(inSectionSize))
+    newParams = _makeParams(inCommandCount, "iNew")
+    start = time.perf_counter()
+    for anchor, par in zip(anchors, newParams):
+        paramList.insertAfter(anchor, par)
+        paramList.get(anchor)
+    tParamList = time.perf_counter() - start
+
+    return tList, tParamList
+
+
+def benchCommandSheet(inSectionSize, inCommandCount):
+    """
+    createParamfromCSV cell by cell vs. applyCommands on the whole sheet
+    """
+    rows = [("iNew%d -a xPar%d -t Integer -d Bench" % (i, (i * 7919) % inSectionSize // 10 * 10 + 1), str(i)) for i in range(inCommandCount)]
+
+    section = ParamSection(makeSectionXML(inSectionSize))
+    start = time.perf_counter()
+    for row in rows:
+        section.createParamfromCSV(*row)
+    tCells = time.perf_counter() - start
+
+    section = ParamSection(makeSectionXML(inSectionSize))
+    start = time.perf_counter()
+    section.applyCommands(rows)
+    tBatch = time.perf_counter() - start
+
+    return tCells, tBatch
+
+
+def benchArrays(inRows, inColumns, inType=PAR_LENGTH):
+    """
+    Parsing and writing an inRows x inColumns array param with ResizeableGDLDict vs. GDLArray storage
+    :return:    {bDenseArrays: (parse [s], write [s], memory of the parsed param [bytes])}
+    """
+    eTree = etree.XML(etree.tostring(Param(inType=inType, inName="xArray",
+                                           inAVals=[[i * 0.25 + j for j in range(inColumns)] for i in range(inRows)]).eTree))
+    result = {}
+    for dense in (False, True):
+        Param.bDenseArrays = dense
+        tracemalloc.start()
+        start = time.perf_counter()
+        par = Param(eTree)
+        tParse = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        par.eTree
+        tWrite = time.perf_counter() - start
+        result[dense] = (tParse, tWrite, memory)
+    Param.bDenseArrays = False
+    return result
+
+
+def benchCellQuery(inRows, inColumns, inDense=False):
+    """
+    Dotted-id value query (the former getParamIDsByTypeNameAndValue) vs. Param.iterCells() on one array param
+    """
+    Param.bDenseArrays = inDense
+    par = Param(inType=PAR_LENGTH, inName="xArray", inAVals=[[float((i * j) % 7) for j in range(inColumns)] for i in range(inRows)])
+    Param.bDenseArrays = False
+
+    start = time.perf_counter()
+    [path for path in par.getHashableIDs() if par.getValueByPath(".".join(path.split(".")[1:])) == 3.0]
+    tDotted = time.perf_counter() - start
+
+    start = time.perf_counter()
+    list(par.iterCells(3.0))
+    tCells = time.perf_counter() - start
+
+    return tDotted, tCells
+
+
+def benchClone(inSectionSize, inCopies, inEdits=2):
+    """
+    deepcopy vs. copyOnWrite of a section inCopies times, editing inEdits params of each copy, then iterating over
+    the copies and the source, which makes a copyOnWrite section copy each param it hands out
+    :return:    (deepcopy [s], copyOnWrite [s], memory of deepcopies [bytes], memory of copyOnWrite copies [bytes],
+                iterating after deepcopy [s], iterating after copyOnWrite [s])
+    """
+    result = []
+    for clone in (copy.deepcopy, ParamSection.copyOnWrite):
+        section = ParamSection(makeSectionXML(inSectionSize))
+        tracemalloc.start()
+        start = time.perf_counter()
+        copies = []
+        for i in range(inCopies):
+            c = clone(section)
+            for j in range(inEdits):
+                c["xPar%d" % ((i + j) % inSectionSize)] = float(j)
+            copies.append(c)
+        tClone = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for c in copies + [section]:
+            for _ in c:
+                pass
+        result.append((tClone, memory, time.perf_counter() - start))
+    return result[0][0], result[1][0], result[0][1], result[1][1], result[0][2], result[1][2]
+
+
+def benchMemory(inSections, inSectionSize, inLazy=False):
+    """
+    Memory of a library of inSections sections of inSectionSize params each, parsed from xml
+    :return:    (bytes in total, bytes per param)
+    """
+    sources = [etree.tostring(makeSectionXML(inSectionSize)) for _ in range(inSections)]
+    parser = etree.XMLParser(strip_cdata=False)
+    gc.collect()
+    tracemalloc.start()
+    library = [ParamSection(etree.XML(source, parser), inLazy=inLazy) for source in sources]
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory, memory / (inSections * inSectionSize * 1.1)
+
+
+def benchDiff(inSectionSize, inRows, inColumns, inEdits=100):
+    """
+    ParamSection.diff() of a section of inSectionSize params and an inRows x inColumns array against an edited copy
+    :return:    (deepcopies [s], diff [s], number of changes)
+    """
+    old = ParamSection(makeSectionXML(inSectionSize))
+    old.append(Param(inType=PAR_LENGTH, inName="xArray", inAVals=[[float(i + j) for j in range(inColumns)] for i in range(inRows)]), "xArray")
+    start = time.perf_counter()
+    new = copy.deepcopy(old)
+    tCopy = time.perf_counter() - start
+    for i in range(inEdits):
+        new["xPar%d" % (i * 7919 % inSectionSize)] = -1.0
+        new["xArray"][i * 31 % inRows + 1][i % inColumns + 1] = -1.0
+    new.remove_param("xPar3")
+    start = time.perf_counter()
+    changes = old.diff(new)
+    return tCopy, time.perf_counter() - start, len(changes)
+
+
+if __name__ == "__main__":
+    print("%8s %8s %12s %12s" % ("params", "commands", "list [s]", "ParamList [s]"))
+    for size in (100, 1000, 5000, 20000):
+        for commands in (100, 1000):
+            tList, tParamList = benchInserts(size, commands)
+            print("%8d %8d %12.4f %12.4f" % (size, commands, tList, tParamList))
+
+    print()
+    print("%8s %8s %12s %12s" % ("params", "commands", "cells [s]", "batch [s]"))
+    for size, commands in ((1000, 1000), (5000, 10000)):
+        tCells, tBatch = benchCommandSheet(size, commands)
+        print("%8d %8d %12.4f %12.4f" % (size, commands, tCells, tBatch))
+
+    print()
+    print("%12s %8s %12s %12s %12s" % ("array", "storage", "parse [s]", "write [s]", "memory [kB]"))
+    for rows, columns in ((100, 10), (1000, 50)):
+        for dense, (tParse, tWrite, memory) in benchArrays(rows, columns).items():
+            print("%12s %8s %12.4f %12.4f %12d" % ("%dx%d" % (rows, columns), "numpy" if dense else "dict", tParse, tWrite, memory // 1024))
+
+    print()
+    print("%12s %8s %12s %12s" % ("array", "storage", "dotted [s]", "cells [s]"))
+    for rows, columns in ((100, 100), (1000, 100)):
+        for dense in (False, True):
+            tDotted, tCells = benchCellQuery(rows, columns, dense)
+            print("%12s %8s %12.4f %12.4f" % ("%dx%d" % (rows, columns), "numpy" if dense else "dict", tDotted, tCells))
+
+    print()
+    print("%8s %8s %12s %12s %12s %12s %12s %12s" % ("params", "copies", "deepcopy [s]", "COW [s]", "deep [kB]", "COW [kB]",
+                                                   "iter deep [s]", "iter COW [s]"))
+    for size, copies in ((1000, 50), (5000, 20), (8000, 5)):
+        tDeep, tCOW, mDeep, mCOW, tIterDeep, tIterCOW = benchClone(size, copies)
+        print("%8d %8d %12.4f %12.4f %12d %12d %12.4f %12.4f" % (size, copies, tDeep, tCOW, mDeep // 1024, mCOW // 1024, tIterDeep, tIterCOW))
+
+    print()
+    print("%8s %8s %8s %12s %12s" % ("sections", "params", "lazy", "memory [MB]", "bytes/param"))
+    for lazy in (False, True):
+        memory, perParam = benchMemory(200, 1000, lazy)
+        print("%8d %8d %8s %12.1f %12.0f" % (200, 1000, lazy, memory / 2 ** 20, perParam))
+
+    print()
+    print("%8s %12s %12s %12s %8s" % ("params", "array", "deepcopy [s]", "diff [s]", "changes"))
+    for size, rows, columns in ((1000, 100, 100), (5000, 1000, 100), (20000, 1000, 1000)):
+        tCopy, tDiff, count = benchDiff(size, rows, columns)
+        print("%8d %12s %12.4f %12.4f %8d" % (size, "%dx%d" % (rows, columns), tCopy, tDiff, count))
@@ -0,0 +1,137 @@
+"""
+Benchmarks of SourceXML library loading, run as a script:
+    python bench_SourceXML.py [file count]
+    python bench_SourceXML.py --ingest [library MB] [file MB]
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from GSMXMLLib import SourceXML, SourceXMLCache, XMLFile, parseXMLFile
+from lxml import etree
+from test_SourceXML import makeSourceXML
+
+
+def benchLoadLibrary(inDir, inRelPaths, inProcesses):
+    """
+    :return:    files loaded per second with inProcesses worker processes
+    """
+    SourceXML.source_guids.clear()
+    SourceXML.replacement_dict.clear()
+    XMLFile.all_keywords.clear()
+    SourceXML.sSourceXMLDir = inDir
+    start = time.perf_counter()
+    SourceXML.loadLibrary(inRelPaths, processes=inProcesses)
+    return len(inRelPaths) / (time.perf_counter() - start)
+
+
+def benchCache(inDir, inRelPaths):
+    """
+    :return:    seconds of loading without cache, with a cold cache, with a warm cache and of only reading the files
+    """
+    result = [benchLoadLibrary(inDir, inRelPaths, 1)]
+    with tempfile.TemporaryDirectory() as cacheDir:
+        SourceXML.cache = SourceXMLCache(cacheDir)
+        result.append(benchLoadLibrary(inDir, inRelPaths, 1))
+        result.append(benchLoadLibrary(inDir, inRelPaths, 1))
+        SourceXML.cache = None
+    start = time.perf_counter()
+    for relPath in inRelPaths:
+        with open(os.path.join(inDir, relPath), "rb") as f:
+            f.read()
+    result.append(len(inRelPaths) / (time.perf_counter() - start))
+    return [len(inRelPaths) / r for r in result]
+
+
+def benchHeaderOnly(inDir, inRelPaths):
+    """
+    :return:    seconds of loading the files fully and header-only
+    """
+    SourceXML.sSourceXMLDir = inDir
+    result = []
+    for headerOnly in (False, True):
+        start = time.perf_counter()
+        for relPath in inRelPaths:
+            SourceXML(relPath, register=False, header_only=headerOnly)
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def _ingest(inMode, inDir):
+    """
+    Parsing every file of inDir one after the other, run in a child process by benchIngestion()
+    :return:    (seconds, peak RSS [kB])
+    """
+    start = time.perf_counter()
+    for fileName in sorted(os.listdir(inDir)):
+        path = os.path.join(inDir, fileName)
+        if inMode == "string":
+            # What the test runners do
+            with open(path, "r") as f:
+                tree = etree.XML(f.read(), etree.XMLParser(strip_cdata=False, huge_tree=True))
+        elif inMode == "path":
+            # SourceXML and DestXML before parseXMLFile()
+            tree = etree.parse(path, etree.XMLParser(strip_cdata=False, huge_tree=True))
+        else:
+            tree = parseXMLFile(path)
+        del tree
+    return time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def benchIngestion(inLibraryMB, inFileMB):
+    """
+    Peak RSS and time of parsing a library of inLibraryMB in files of about inFileMB, each way in a fresh process
+    :return:    {mode: (seconds, peak RSS [kB])}
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as tempDir:
+        path = os.path.join(tempDir, makeSourceXML(tempDir, "Large", "GUID-LARGE", inFileMB * 9000))
+        fileSize = os.path.getsize(path)
+        for i in range(1, max(1, inLibraryMB * 2 ** 20 // fileSize)):
+            shutil.copyfile(path, os.path.join(tempDir, "Large%05d.xml" % i))
+        for mode in ("string", "path", "mmap"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--ingest-child", mode, tempDir],
+                                 check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+            result[mode] = (float(out[0]), int(out[1]))
+    return result
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--ingest-child"]:
+    print("%f %d" % _ingest(sys.argv[2], sys.argv[3]))
+elif __name__ == "__main__" and sys.argv[1:2] == ["--ingest"]:
+    libraryMB = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    fileMB = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    print("%8s %10s %12s" % ("mode", "time [s]", "peak RSS [MB]"))
+    for mode, (seconds, rss) in benchIngestion(libraryMB, fileMB).items():
+        print("%8s %10.2f %12.1f" % (mode, seconds, rss / 1024))
+elif __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tempDir:
+        relPaths = [makeSourceXML(tempDir, "Object%05d" % i, "GUID-%05d" % i, 200, ("Object%05d" % ((i + 1) % count), ))
+                    for i in range(count)]
+        processes = [1]
+        while processes[-1] * 2 <= (os.cpu_count() or 1):
+            processes.append(processes[-1] * 2)
+        if processes[-1] != os.cpu_count():
+            processes.append(os.cpu_count())
+
+        print("%10s %12s %8s" % ("processes", "files/s", "speedup"))
+        single = None
+        for n in processes:
+            throughput = benchLoadLibrary(tempDir, relPaths, n)
+            single = single or throughput
+            print("%10d %12.1f %8.2f" % (n, throughput, throughput / single))
+
+        print()
+        print("%12s %12s %12s %12s" % ("no cache [s]", "cold [s]", "warm [s]", "read [s]"))
+        print("%12.3f %12.3f %12.3f %12.3f" % tuple(benchCache(tempDir, relPaths)))
+
+        print()
+        print("%12s %12s" % ("full [s]", "header [s]"))
+        print("%12.3f %12.3f" % tuple(benchHeaderOnly(tempDir, relPaths)))
@@ -1,5 +1,7 @@
 def pytest_collection_modifyitems(items):
     for item in items:
+        if not hasattr(item, 'callspec') or 'inTestCase' not in item.callspec.params:
+            continue
         if 'Note' in item._request.node.callspec.params['inTestCase'] and item._request.node.callspec.params['inTestCase']['Note']:
             item._nodeid = item._request.node.callspec.params['inTestCase']['Note'] + '::' + item._request.node.callspec.params['inTestCase']['fileName']
         else:
@@ -0,0 +1,168 @@
+import io
+import os
+
+import pytest
+
+from GSMXMLLib import SourceXML, DestXML, SourceResource, DestResource, BulkWriter
+from lxml import etree
+from test_SourceXML import sourceLibrary
+
+
+@pytest.fixture
+def destDir(tmp_path):
+    DestXML.sDestXMLDir = str(tmp_path / "dest")
+    yield DestXML.sDestXMLDir
+    DestXML.dest_dict.clear()
+    DestXML.id_dict.clear()
+    DestXML.dest_sourcenames.clear()
+    DestResource.pict_dict.clear()
+    SourceResource.source_pict_dict.clear()
+
+
+def test_BulkWriter(sourceLibrary, destDir, tmp_path):
+    sources = [SourceXML(relPath) for relPath in sourceLibrary[:4]]
+    dests = [DestXML(source) for source in sources]
+    dests[1].parameters["xPar3"] = 42.5
+
+    os.makedirs(str(tmp_path / "pict"))
+    with open(str(tmp_path / "pict" / "image.png"), "wb") as f:
+        f.write(b"\x89PNG" + bytes(range(256)))
+    SourceResource.sSourceResourceDir = str(tmp_path / "pict")
+    resource = DestResource(SourceResource("image.png"), str(tmp_path / "destpict"))
+
+    missing = DestXML(SourceXML(sourceLibrary[5]))
+    os.remove(missing.sourceFile.fullPath)
+
+    DestXML.id_dict["G-MACRO02"] = "NEW-GUID"
+    writer = BulkWriter(max_workers=3, max_pending=2)
+    results = writer.write(dests + [resource, missing])
+    assert [r.file for r in results] == dests + [resource, missing]
+    assert all(r.ok for r in results[:-1]) and isinstance(results[-1].error, OSError)
+    assert writer.stats["files"] == 6 and writer.stats["errors"] == 1
+
+    out = etree.parse(results[1].path).getroot()
+    assert out.get("MainGUID") == dests[1].guid
+    # Macro01 calls Macro02
+    assert out.find("CalledMacros/Macro/MainGUID").text == "NEW-GUID"
+    assert out.find("ParamSection/Parameters/Length[@Name='xPar3']/Value").text == "42.5"
+    with open(results[4].path, "rb") as f:
+        assert f.read() == b"\x89PNG" + bytes(range(256))
+    assert not [n for n in os.listdir(destDir) if n.endswith(".tmp")]
+
+
+def test_toBytes_same_writer_as_toFile(sourceLibrary, destDir):
+    # Pretty printed source with a comment before the root
+    fullPath = os.path.join(SourceXML.sSourceXMLDir, sourceLibrary[2])
+    pretty = etree.tostring(etree.parse(fullPath, etree.XMLParser(strip_cdata=False)), pretty_print=True)
+    with open(fullPath, "wb") as f:
+        f.write(b"<!-- exported -->\n" + pretty)
+    dest = DestXML(SourceXML(sourceLibrary[2]))
+    dest.parameters["xPar3"] = 42.5
+    DestXML.id_dict["G-MACRO03"] = "NEW-GUID"
+
+    stream = io.BytesIO()
+    dest.toFile(stream)
+    assert dest.toBytes() == stream.getvalue()
+
+    # Same as serializing the whole tree
+    tree = etree.parse(fullPath, etree.XMLParser(strip_cdata=False))
+    root = tree.getroot()
+    root.set("MainGUID", dest.guid)
+    root.find("CalledMacros/Macro/MainGUID").text = "NEW-GUID"
+    section = dest.parameters.toEtree()
+    section.tail = root.find("ParamSection").tail
+    root.replace(root.find("ParamSection"), section)
+    assert dest.toBytes() == etree.tostring(tree, xml_declaration=True, encoding="UTF-8")
+
+
+def test_BuildManifest_rebuilds_only_changed(tmp_path, destDir):
+    from GSMXMLLib import BuildManifest, XMLFile
+    from test_SourceXML import makeSourceXML
+
+    SourceXML.sSourceXMLDir = str(tmp_path)
+    relPaths = [makeSourceXML(str(tmp_path), name, "GUID-" + name, 3, macros)
+                for name, macros in (("A", ("B", )), ("B", ()), ("C", ()), )]
+    manifestPath = str(tmp_path / "manifest.json")
+
+    def build(inInputs):
+        SourceXML.replacement_dict.clear()
+        SourceXML.source_guids.clear()
+        DestXML.dest_dict.clear()
+        DestXML.id_dict.clear()
+        dests = [DestXML(SourceXML(relPath), new_guid=False) for relPath in relPaths]
+        inputs = {dest: inInputs.get(dest.name) for dest in dests}
+        manifest = BuildManifest(manifestPath)
+        stale = manifest.getStale(dests, inputs)
+        manifest.recordResults(BulkWriter(overwrite=True).write(stale), inputs)
+        manifest.save()
+        return [dest.name for dest in stale]
+
+    try:
+        assert build({}) == ["A", "B", "C", ]
+        assert build({}) == []
+        # B is called by A
+        with open(str(tmp_path / "B.xml"), "a") as f:
+            f.write("\n")
+        assert build({}) == ["A", "B", ]
+        assert build({}) == []
+        os.remove(os.path.join(destDir, "C.xml"))
+        assert build({}) == ["C", ]
+        assert build({}) == []
+        assert build({"B": [("xPar1", "2")]}) == ["B", ]
+        assert build({"B": [("xPar1", "2")]}) == []
+    finally:
+        SourceXML.replacement_dict.clear()
+        SourceXML.source_guids.clear()
+        XMLFile.all_keywords.clear()
+
+
+def test_GUIDRemapper(tmp_path):
+    from GSMXMLLib import GUIDRemapper
+
+    old1, old2 = "0A1B2C3D-0000-4000-8000-000000000001", "0A1B2C3D-0000-4000-8000-000000000002"
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / ("f%d.xml" % i))
+        with open(path, "w") as f:
+            f.write('<Symbol MainGUID="NEW-%d"><Ancestry><MainGUID>%s</MainGUID></Ancestry>'
+                    '<CalledMacros><Macro><MainGUID>%s</MainGUID></Macro></CalledMacros>'
+                    '<Script_3D><![CDATA[call "x" ! %s\\nid = "%s-X%s"]]></Script_3D>'
+                    '<MigrationTable><MainGUID>%s</MainGUID></MigrationTable></Symbol>' % (i, old1, old2.lower(), old2, old1, i, old2))
+        paths.append(path)
+    paths.append(str(tmp_path / "missing.xml"))
+
+    remapper = GUIDRemapper({old1: "NEW-A", old2: "NEW-B", "SAME": "SAME", })
+    results = remapper.remapFiles(paths, processes=2)
+    assert isinstance(results[paths[-1]], OSError)
+    assert results[paths[0]] == {old1: 1, old2: 2, }
+    assert remapper.counts == {old1: 3, old2: 6, }
+    with open(paths[1]) as f:
+        text = f.read()
+    assert text.upper().count(old2) == 1
+    assert "<MainGUID>NEW-A</MainGUID>" in text and "<MainGUID>NEW-B</MainGUID>" in text and "! NEW-B" in text
+    # Part of a longer token, or outside of GUIDRemapper.sRemapElements: kept
+    assert text.count(old1) == 1 and '"%s-X1"' % old1 in text
+    assert "<MigrationTable><MainGUID>%s</MainGUID></MigrationTable>" % old2 in text
+
+
+@pytest.mark.parametrize("inChunkSize", [1, 7, 64, 1000, ])
+def test_GUIDRemapper_chunks(tmp_path, monkeypatch, inChunkSize):
+    from GSMXMLLib import GUIDRemapper
+
+    old1, old2 = "0A1B2C3D-0000-4000-8000-000000000001", "0A1B2C3D-0000-4000-8000-000000000002"
+    data = ('<Symbol><Ancestry a="1"><MainGUID>%s</MainGUID><MainGUID>%s</MainGUID></Ancestry><CalledMacros/>'
+            '<ParamSection>%s</ParamSection><Script_2D SubIdent="0">%s %s-%s</Script_2D></Symbol>'
+            % (old1, old2, old1, old2 + old1, old1, old2)).encode("ascii") * 20
+    expected = ('<Symbol><Ancestry a="1"><MainGUID>NEW-A</MainGUID><MainGUID>NEW-B</MainGUID></Ancestry><CalledMacros/>'
+                '<ParamSection>%s</ParamSection><Script_2D SubIdent="0">%s %s-%s</Script_2D></Symbol>'
+                % (old1, old2 + old1, old1, old2)).encode("ascii") * 20
+    path = str(tmp_path / "f.xml")
+    with open(path, "wb") as f:
+        f.write(data)
+
+    monkeypatch.setattr(GUIDRemapper, "sChunkSize", inChunkSize)
+    remapper = GUIDRemapper({old1: "NEW-A", old2: "NEW-B", })
+    assert remapper.remapFile(path) == {old1: 20, old2: 20, }
+    with open(path, "rb") as f:
+        assert f.read() == expected
+    assert remapper.remapBytes(data) == (expected, {old1: 20, old2: 20, })
@@ -0,0 +1,318 @@
+import copy
+import glob
+import os
+import pickle
+import random
+
+import pytest
+
+from GSMParamLib import Param, PAR_INT, PAR_LENGTH, PARFLG_CHILD, PARFLG_HIDDEN, PARFLG_UNIQUE, formatFloatList, formatFloats
+from lxml import etree
+
+
+def _arrayParam(inRows=20, inCols=5):
+    return Param(inType=PAR_LENGTH, inName="xArr", inAVals=[[i + j / 10 for j in range(inCols)] for i in range(inRows)])
+
+
+def test_eTree_cache_hits():
+    par = _arrayParam()
+    Param.resetCacheStats()
+    first = etree.tostring(par.eTree)
+    assert etree.tostring(par.eTree) == first
+    assert Param.cacheStats["eTreeHits"] == 1
+    assert Param.cacheStats["eTreeMisses"] == 1
+    assert Param.cacheStats["aValsMisses"] == 1
+
+
+def test_eTree_cache_invalidated_by_mutators():
+    par = _arrayParam()
+    par.eTree
+    par[2][3] = 99.0
+    assert par.eTree.find("ArrayValues/AVal[@Row='2'][@Column='3']").text == "99"
+    par.flags.add(PARFLG_CHILD)
+    assert par.eTree.find("Flags/ParFlg_Child") is not None
+    par.desc = "changed"
+    assert par.eTree.find("Description").text == '"changed"'
+    par.setValue(1.5)
+    assert par.eTree.find("Value").text == "1.5"
+
+
+@pytest.mark.parametrize("inDense", (False, True, ))
+def test_eTree_cache_kept_by_reads(inDense):
+    if inDense:
+        pytest.importorskip("numpy")
+    Param.bDenseArrays = inDense
+    try:
+        par = _arrayParam()
+    finally:
+        Param.bDenseArrays = False
+    first = etree.tostring(par.eTree)
+    Param.resetCacheStats()
+    cells = [par[i][j] for i in range(1, 21) for j in range(1, 6)] + [par.getValueByCell((3, 2))]
+    rows = [i for i in par]
+    assert etree.tostring(par.eTree) == first and etree.tostring(par.aVals) == etree.tostring(par.eTree.find("ArrayValues"))
+    assert (Param.cacheStats["eTreeHits"], Param.cacheStats["eTreeMisses"], Param.cacheStats["aValsMisses"]) == (2, 0, 0)
+    assert len(cells) == 101 and rows
+
+    # Writes through a row, kept from an earlier read
+    row = par[3]
+    row[2] = 42.0
+    assert par.eTree.find("ArrayValues/AVal[@Row='3'][@Column='2']").text == "42"
+    assert par.aVals.find("AVal[@Row='3'][@Column='2']").text == "42"
+    assert Param.cacheStats["eTreeMisses"] == 1
+
+
+@pytest.mark.parametrize("inDense", (False, True, ))
+def test_array_indices_from_1(inDense):
+    if inDense:
+        pytest.importorskip("numpy")
+    Param.bDenseArrays = inDense
+    try:
+        vector = Param(inType=PAR_INT, inName="iArr", inAVals=[1, 2, 3])
+        matrix = _arrayParam(2, 2)
+    finally:
+        Param.bDenseArrays = False
+    for index in (0, -1, -3):
+        with pytest.raises(IndexError):
+            vector[index]
+        with pytest.raises(IndexError):
+            vector[index] = 9
+        with pytest.raises(IndexError):
+            matrix[index][1] = 9.0
+        with pytest.raises(IndexError):
+            matrix[1][index]
+    assert [vector[i] for i in (1, 2, 3)] == [1, 2, 3]
+    assert etree.tostring(matrix.eTree) == etree.tostring(_arrayParam(2, 2).eTree)
+
+    # Reading past the end gives an empty cell instead of an error, like the dict storage always did
+    assert not vector[5]
+    assert not matrix[4][1]
+    if inDense:
+        assert (vector.dimensions, matrix.dimensions) == ((5, 0), (4, 2))
+
+
+def test_dense_arrays_same_output():
+    pytest.importorskip("numpy")
+    source = etree.XML(etree.tostring(_arrayParam(30, 4).eTree))
+    dictPar = Param(source)
+    Param.bDenseArrays = True
+    try:
+        densePar = Param(source)
+    finally:
+        Param.bDenseArrays = False
+    assert etree.tostring(densePar.eTree) == etree.tostring(dictPar.eTree)
+    assert densePar[3][2] == dictPar[3][2]
+
+
+def test_dense_arrays_resize_on_write():
+    pytest.importorskip("numpy")
+    Param.bDenseArrays = True
+    try:
+        par = _arrayParam(2, 2)
+    finally:
+        Param.bDenseArrays = False
+    par[4][3] = 7.5
+    aVals = par.eTree.find("ArrayValues")
+    assert (aVals.get("FirstDimension"), aVals.get("SecondDimension")) == ("4", "3")
+    assert aVals.find("AVal[@Row='4'][@Column='3']").text == "7.5"
+    assert aVals.find("AVal[@Row='3'][@Column='1']").text == "0"
+    assert par.dimensions == (4, 3)
+
+
+def _valueToStringReference(inVal):
+    # Param._valueToString for Length/Angle/RealNum as it was before formatFloat()
+    nDigits = 0
+    eps = 1E-7
+    s = '%.' + str(nDigits) + 'f'
+    while nDigits < 8:
+        if (inVal - eps < float(s % inVal) < inVal + eps):
+            break
+        nDigits += 1
+        s = '%.' + str(nDigits) + 'f'
+    return s % inVal
+
+
+def _randomFloats(inCount, inSeed=42):
+    rnd = random.Random(inSeed)
+    result = [0.0, -0.0, 1.0, -1.0, 0.5, 2.5, 1E-8, -1E-8, 5E-8, 1E12, 123456789.123, 3]
+    for _ in range(inCount):
+        magnitude = 10 ** rnd.randint(-9, 13)
+        value = rnd.uniform(-magnitude, magnitude)
+        result.append(value)
+        result.append(round(value, rnd.randint(0, 9)))
+        result.append(value + rnd.choice((-1, 1)) * rnd.uniform(0, 2E-7))
+    return result
+
+
+def test_formatFloat_same_as_reference():
+    values = _randomFloats(20000)
+    par = Param(inType=PAR_LENGTH, inName="xTest")
+    for value in values:
+        assert par._valueToString(value) == _valueToStringReference(value), value
+    assert formatFloatList(values) == [_valueToStringReference(v) for v in values]
+
+
+def test_formatFloats_numpy_same_as_reference():
+    np = pytest.importorskip("numpy")
+    values = _randomFloats(2000, 7)
+    assert formatFloats(np.array(values, dtype=np.float64)).tolist() == [_valueToStringReference(float(v)) for v in values]
+
+
+def _dottedIDsReference(inParam, inValue):
+    # getParamIDsByTypeNameAndValue() before iterCells(): dotted ids split and re-joined for every cell
+    return [path for path in inParam.getHashableIDs()
+            if inParam.getValueByPath(".".join(path.split(".")[1:])) == inValue or not inValue]
+
+
+@pytest.mark.parametrize("inDense", (False, True, ))
+def test_iterCells_same_as_dotted_paths(inDense):
+    if inDense:
+        pytest.importorskip("numpy")
+    Param.bDenseArrays = inDense
+    try:
+        pars = [_arrayParam(6, 3), Param(inType=PAR_LENGTH, inName="xVec", inAVals=[1.5, 2.0, 1.5]),
+                Param(inType=PAR_LENGTH, inName="xOne", inValue=1.5), ]
+    finally:
+        Param.bDenseArrays = False
+    for par in pars:
+        for value in (None, 1.5, 2.0, 2.1, ):
+            assert [".".join(str(_p) for _p in path) for path, _ in par.iterCells(value)] == _dottedIDsReference(par, value)
+    assert [path for path, _ in pars[0].iterCells(predicate=lambda v: v > 5.05)] == [("xArr", 6, 2), ("xArr", 6, 3), ]
+    pars[0].setValueByCell((2, 3), 42.0)
+    assert pars[0].getValueByPath("2.3") == 42.0
+
+
+_POLYLINE = '''<Dictionary Name="polyline">
+			<Description><![CDATA["Polyline"]]></Description>
+			<Value>
+				<Integer Name="isClosed">0</Integer>
+				<String Name="label"><![CDATA["a < b"]]></String>
+				<Dictionary Name="contour">
+					<Array Name="edges">
+						<Dictionary Index="1">
+							<Integer Name="type">0</Integer>
+							<RealNum Name="arcAngle">0.5</RealNum>
+						</Dictionary>
+						<Dictionary Index="2">
+							<Integer Name="type">1</Integer>
+							<RealNum Name="arcAngle">0</RealNum>
+						</Dictionary>
+					</Array>
+				</Dictionary>
+				<Integer Name="last">2</Integer>
+			</Value>
+		</Dictionary>
+		
+'''
+
+
+def test_dictionary_paths():
+    par = Param(etree.XML(_POLYLINE, etree.XMLParser(strip_cdata=False)))
+    assert par.value["contour"]["edges"][1] == {"type": 1, "arcAngle": 0.0}
+    # Items of different tags keep their order
+    assert etree.tostring(par.eTree, pretty_print=True).decode() == _POLYLINE
+
+    assert par.getHashableIDs() == ["polyline.isClosed", "polyline.label", "polyline.contour.edges.1.type", "polyline.contour.edges.1.arcAngle",
+                                    "polyline.contour.edges.2.type", "polyline.contour.edges.2.arcAngle", "polyline.last", ]
+    assert [path for path, _ in par.iterCells(1)] == [("polyline", "contour", "edges", 2, "type")]
+    assert par.getValueByPath("contour.edges.1.arcAngle") == 0.5
+
+    par.setValueByPath("contour.edges.2.arcAngle", 1.25)
+    par.setValueByCell(("contour", "closed"), True)
+    eTree = par.eTree
+    assert eTree.find("Value/Dictionary/Array/Dictionary[@Index='2']/RealNum").text == "1.25"
+    assert eTree.find("Value/Dictionary/Boolean[@Name='closed']").text == "1"
+
+    par.setValue({"P1": 2, "P2": "a"})
+    assert [(e.tag, e.text) for e in par.eTree.find("Value")] == [("Integer", "2"), ("String", '"a"')]
+
+
+def test_flags_bitmask_set_compatible():
+    par = Param(inType=PAR_LENGTH, inName="xPar", inValue=1.5, inHidden=True)
+    assert not hasattr(par, "__dict__")
+    assert PARFLG_HIDDEN in par.flags and PARFLG_CHILD not in par.flags
+    par.flags.add(PARFLG_CHILD)
+    par.flags |= {PARFLG_UNIQUE}
+    par.flags.discard(PARFLG_HIDDEN)
+    assert par.flags == {PARFLG_CHILD, PARFLG_UNIQUE} and len(par.flags) == 2
+    assert [f.tag for f in par.eTree.find("Flags")] == ["ParFlg_Child", "ParFlg_Unique"]
+
+    lazy = Param(etree.XML(etree.tostring(par.eTree), etree.XMLParser(strip_cdata=False)), inLazy=True)
+    for clone in (pickle.loads(pickle.dumps(lazy)), copy.deepcopy(lazy)):
+        assert etree.tostring(clone.eTree) == etree.tostring(par.eTree)
+        assert clone.flags == par.flags and clone.value == 1.5
+
+
+def test_cells_after_write_past_size():
+    pytest.importorskip("numpy")
+    Param.bDenseArrays = True
+    try:
+        par = _arrayParam(2, 2)
+    finally:
+        Param.bDenseArrays = False
+    par[4][3] = 7.5
+    assert len(list(par.iterCells())) == 12
+    assert par.getCellPaths()[-1] == ("xArr", 4, 3)
+    assert list(par.iterCells(7.5)) == [(("xArr", 4, 3), 7.5)]
+    assert par.getValueByPath("4.3") == 7.5
+
+
+def test_diff_after_write_past_size():
+    pytest.importorskip("numpy")
+    Param.bDenseArrays = True
+    try:
+        old = _arrayParam(2, 2)
+    finally:
+        Param.bDenseArrays = False
+    new = copy.deepcopy(old)
+    new[3][2] = 7.5
+    assert [c.cells for c in old.diff(new)] == [[((3, 1), None, 0.0), ((3, 2), None, 7.5)]]
+
+    # Both grown the same way: compared along the whole arrays
+    old[3][2] = 2.5
+    assert [c.cells for c in old.diff(new)] == [[((3, 2), 2.5, 7.5)]]
+
+
+def test_dictionary_keeps_source_texts():
+    source = _POLYLINE.replace('<RealNum Name="arcAngle">0.5</RealNum>', '<RealNum Name="arcAngle">2.50</RealNum>') \
+                      .replace('<Integer Name="last">2</Integer>', '<Boolean Name="last">true</Boolean>')
+    par = Param(etree.XML(source, etree.XMLParser(strip_cdata=False)))
+    assert par.value["contour"]["edges"][0]["arcAngle"] == 2.5 and par.value["last"] is True
+    assert etree.tostring(par.eTree, pretty_print=True).decode() == source
+
+    # Only the changed items are formatted again
+    par.setValueByPath("contour.edges.2.arcAngle", 1.25)
+    par.setValueByCell(("isClosed", ), 1)
+    eTree = par.eTree
+    assert [e.text for e in eTree.iter("RealNum")] == ["2.50", "1.25"]
+    assert (eTree.find("Value/Boolean").text, eTree.find("Value/Integer").text) == ("true", "1")
+    assert etree.tostring(pickle.loads(pickle.dumps(copy.deepcopy(par))).eTree) == etree.tostring(eTree)
+
+    par.setValueByCell(("last", ), False)
+    assert par.eTree.find("Value/Boolean").text == "0"
+
+
+_PARAM_FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "samuTest_param", "*.xml")))
+
+
+@pytest.mark.parametrize("inPath", _PARAM_FIXTURES, ids=os.path.basename)
+def test_lazy_fixture_same_as_eager(inPath):
+    # Parsed with the default parser, which strips CDATA: copied out untouched, the texts still have to be CDATA
+    with open(inPath) as f:
+        source = f.read()
+    eager = etree.tostring(Param(etree.XML(source)).eTree, pretty_print=True)
+    assert etree.tostring(Param(etree.XML(source), inLazy=True).eTree, pretty_print=True) == eager
+    assert eager.decode() == source
+
+
+def test_dictionary_digit_keys():
+    par = Param(etree.XML(_POLYLINE, etree.XMLParser(strip_cdata=False)))
+    par.setValue({"2024": {"edges": [{"type": 1}, {"type": 2}]}, "1": 3})
+    assert par.pathToCell("2024.edges.2.type") == ("2024", "edges", 2, "type")
+    assert par.getValueByPath("2024.edges.2.type") == 2
+    assert par.getValueByPath("1") == 3
+    assert [par.getValueByPath(path.split(".", 1)[1]) for path in par.getHashableIDs()] == [1, 2, 3]
+
+    par.setValueByPath("2024.edges.1.type", 5)
+    par.setValueByPath("2025", 7)
+    assert par.value == {"2024": {"edges": [{"type": 5}, {"type": 2}]}, "1": 3, "2025": 7}
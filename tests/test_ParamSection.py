@@ -0,0 +1,311 @@
+import io
+import time
+
+from GSMParamLib import ParamSection
+from lxml import etree
+
+
+def makeSectionXML(inCount):
+    """
+    Synthetic ParamSection with inCount params, a comment before every 10th
+    """
+    pars = []
+    for i in range(inCount):
+        if i % 10 == 0:
+            pars.append('<!-- block%d: PARAMETER BLOCK -->' % i)
+        pars.append('<Length Name="xPar%d"><Description><![CDATA["Par %d"]]></Description><Value>%d.5</Value></Length>' % (i, i, i))
+    return etree.XML('<ParamSection SectVersion="22" SectionFlags="0" SubIdent="0">'
+                     '<ParamSectHeader><Version>22</Version></ParamSectHeader>'
+                     '<Parameters>%s</Parameters></ParamSection>' % "".join(pars),
+                     etree.XMLParser(strip_cdata=False))
+
+
+def _timeToEtree(inSection, inRepeat=3):
+    result = []
+    for _ in range(inRepeat):
+        start = time.perf_counter()
+        inSection.toEtree()
+        result.append(time.perf_counter() - start)
+    return min(result)
+
+
+def test_toEtree_comment_tails():
+    eTree = ParamSection(makeSectionXML(20)).toEtree()
+    pars = eTree.find("Parameters")
+    assert pars[10].tail == '\n\n\t\t'      # Param before the 2nd comment
+    assert pars[11].tail == '\n\n\t\t'      # Comment itself
+    assert pars[-1].tail == '\n\t'
+
+
+def test_toEtree_scales_linearly():
+    small = ParamSection(makeSectionXML(1000))
+    large = ParamSection(makeSectionXML(8000))
+    _timeToEtree(small, 1)
+    ratio = _timeToEtree(large) / _timeToEtree(small)
+    # 8x the params: linear is ~8, quadratic would be ~64
+    assert ratio < 16, ratio
+
+
+def test_toFile_matches_toEtree():
+    eSection = makeSectionXML(30)
+    for tag in ("WDFrameExpression", "WDOrientation"):
+        _e = etree.SubElement(eSection, tag)
+        etree.SubElement(_e, "Expr").text = "a < b"
+    section = ParamSection(eSection)
+
+    stream = io.BytesIO()
+    section.toFile(stream)
+    assert stream.getvalue() == etree.tostring(section.toEtree(), pretty_print=True, xml_declaration=True, encoding='UTF-8')
+
+
+def test_lazy_section_same_output():
+    eager = ParamSection(makeSectionXML(30)).toEtree()
+    lazy = ParamSection(etree.XML(etree.tostring(eager), etree.XMLParser(strip_cdata=False)), inLazy=True)
+    lazy["xPar3"].value
+    assert etree.tostring(lazy.toEtree()) == etree.tostring(eager)
+
+
+def test_lazy_param_copied_until_changed():
+    lazy = ParamSection(etree.XML('<ParamSection SectVersion="22" SectionFlags="0" SubIdent="0">'
+                                  '<ParamSectHeader><Version>22</Version></ParamSectHeader><Parameters>'
+                                  '<Length Name="A"><Description><![CDATA["A"]]></Description><Value>1.50</Value></Length>'
+                                  '</Parameters></ParamSection>', etree.XMLParser(strip_cdata=False)), inLazy=True)
+    assert lazy["A"].value == 1.5
+    assert lazy["A"].eTree.find("Value").text == "1.50"
+    lazy["A"] = 2.5
+    assert lazy["A"].eTree.find("Value").text == "2.5"
+
+
+def test_lazy_param_detached_from_source():
+    lazy = ParamSection(etree.XML(etree.tostring(makeSectionXML(5)), etree.XMLParser(strip_cdata=False)), inLazy=True)
+    par = lazy["xPar2"]
+    # Only a copy of its own element, not the whole source document
+    assert par._sourceETree.getroottree().getroot() is par._sourceETree
+    par.desc = "Changed"
+    lazy.toEtree()
+    assert par._sourceETree is None and par.value == 2.5
+
+
+def test_applyCommands_same_as_createParamfromCSV():
+    rows = [("iNew%d -a xPar%d -t Integer -d New %d" % (i, i % 5 + 1 + i // 5 * 10, i), str(i)) for i in range(10)] + \
+           [("xPar5", "7.25"), ("xPar6 -r", "1"), ]
+    one = ParamSection(makeSectionXML(40))
+    for row in rows:
+        one.createParamfromCSV(*row)
+    batch = ParamSection(makeSectionXML(40))
+    results = batch.applyCommands(rows)
+    assert all(r.ok for r in results)
+    assert results[-1].param is None
+    assert etree.tostring(batch.toEtree()) == etree.tostring(one.toEtree())
+
+
+def test_applyCommands_collects_errors():
+    section = ParamSection(makeSectionXML(5))
+    results = section.applyCommands([("iA -a noSuchPar", "1"), ("iB", "2"), ])
+    assert not results[0].ok and isinstance(results[0].error, KeyError)
+    assert results[1].ok and section["iB"].value == 2
+
+
+def _scanByTypeNameAndValue(inSection, inType, inName="", inValue=None):
+    # The linear scan getParamsByTypeNameAndValue() used before the indexes
+    return [p for p in inSection._ParamSection__paramList if p.iType == inType and (p.name == inName or not inName) and (p.value == inValue or not inValue)]
+
+
+def test_indexes_match_linear_scan():
+    from GSMParamLib import PAR_LENGTH, PAR_INT, PAR_COMMENT
+
+    section = ParamSection(makeSectionXML(40))
+    section.getParamsByTypeNameAndValue(PAR_LENGTH, value=3.5)
+    section["xPar3"] = 4.5
+    section["xPar7"] = 4.5
+    section.createParamfromCSV("iNew -a xPar1 -t Integer", "4")
+    section.createParamfromCSV("iOther -a xPar0 -t Integer", "4")
+    section.remove_param("xPar4")
+    section["xPar8"].setValue(3.5)
+
+    for iType, name, value in ((PAR_LENGTH, "", None), (PAR_LENGTH, "", 4.5), (PAR_LENGTH, "", 3.5), (PAR_LENGTH, "xPar7", None),
+                               (PAR_LENGTH, "xPar7", 4.5), (PAR_INT, "", 4), (PAR_INT, "iNew", None), (PAR_COMMENT, "", None), ):
+        assert section.getParamsByTypeNameAndValue(iType, name, value=value) == _scanByTypeNameAndValue(section, iType, name, value)
+    assert section.getParamsByType(PAR_INT) == [section["iOther"], section["iNew"]]
+    assert section.viewParamsByType(PAR_INT) is section.viewParamsByType(PAR_INT)
+
+
+def test_value_index_kept_while_parsing_and_copying():
+    import copy
+    from GSMParamLib import Param, PAR_LENGTH
+
+    section = ParamSection(makeSectionXML(20))
+    section.viewParamsByTypeNameAndValue(PAR_LENGTH, value=3.5)
+    version = Param.valueVersion
+    ParamSection(makeSectionXML(20))
+    copy.deepcopy(section)
+    section.copyOnWrite()
+    Param(inType=PAR_LENGTH, inName="xOther", inValue=3.5)
+    assert Param.valueVersion == version
+    section["xPar3"] = 4.5
+    assert Param.valueVersion > version
+
+
+def test_copyOnWrite_shares_until_changed():
+    from GSMParamLib import PAR_LENGTH, PARFLG_HIDDEN
+
+    source = ParamSection(makeSectionXML(30))
+    sourceXML = etree.tostring(source.toEtree())
+    clone = source.copyOnWrite()
+    assert clone.viewParamsByType(PAR_LENGTH)[5] is source.viewParamsByType(PAR_LENGTH)[5]
+
+    clone["xPar5"] = 99.5
+    clone["xPar6"].flags.add(PARFLG_HIDDEN)
+    clone.createParamfromCSV("iNew -a xPar7 -t Integer", "3")
+    assert etree.tostring(source.toEtree()) == sourceXML
+    assert clone.viewParamsByType(PAR_LENGTH)[5] is not source.viewParamsByType(PAR_LENGTH)[5]
+    assert clone.viewParamsByType(PAR_LENGTH)[8] is source.viewParamsByType(PAR_LENGTH)[8]
+    assert clone.getParamsByTypeNameAndValue(PAR_LENGTH, value=99.5) == [clone["xPar5"]]
+
+    # Changing the source doesn't reach the clone either
+    source["xPar8"] = 1.0
+    assert clone["xPar8"].value == 8.5
+
+
+def _typeFromNameReference(inParName):
+    # The re.match chain createParam() used before the compiled classifier
+    import re
+    from GSMParamLib import PAR_BOOL, PAR_INT, PAR_STRING, PAR_LENGTH, PAR_ANGLE
+
+    if re.match(r'\bis[A-Z]', inParName) or re.match(r'\bb[A-Z]', inParName):
+        return PAR_BOOL
+    elif re.match(r'\bi[A-Z]', inParName) or re.match(r'\bn[A-Z]', inParName):
+        return PAR_INT
+    elif re.match(r'\bs[A-Z]', inParName) or re.match(r'\bst[A-Z]', inParName) or re.match(r'\bmp_', inParName):
+        return PAR_STRING
+    elif re.match(r'\bx[A-Z]', inParName) or re.match(r'\by[A-Z]', inParName) or re.match(r'\bz[A-Z]', inParName):
+        return PAR_LENGTH
+    elif re.match(r'\ba[A-Z]', inParName):
+        return PAR_ANGLE
+    return PAR_STRING
+
+
+def test_type_classification():
+    from GSMParamLib import Param, getTypeFromName, PAR_UNKNOWN, PAR_REAL, PAR_INT, PAR_LENGTH, PAR_COMMENT
+
+    names = ["isOn", "bOn", "iCount", "nCount", "sName", "stName", "mp_x", "xA", "yA", "zA", "aRot", "isx", "ix", "A", "",
+             "_iX", "abc", "iS", "stX", "b_", "AC_x", "gs_x", "xx", "1x", ]
+    assert [getTypeFromName(n) for n in names] == [_typeFromNameReference(n) for n in names]
+
+    assert Param.getTypeFromString("Len") == PAR_UNKNOWN
+    assert Param.getTypeFromString("") == PAR_UNKNOWN
+    assert Param.getTypeFromString("Real") == PAR_REAL
+    assert all(Param.getTypeFromString(tag) == iType for iType, tag in enumerate(Param.tagBackList) if tag)
+
+    sheet = [("iNew -a xPar1", "1"), ("xNew -t Integer", "2"), ("Block -t Comment", ""), ("sNew", "a"), ]
+    assert ParamSection.classifyCommandSheet(sheet) == [PAR_INT, PAR_INT, PAR_COMMENT, getTypeFromName("sNew")]
+    assert ParamSection.classifyCommandSheet(ParamSection.compileCommandSheet(sheet))[:2] == [PAR_INT, PAR_INT]
+
+
+def test_diff():
+    from GSMParamLib import Param, ParamChange, PAR_LENGTH, PARFLG_HIDDEN
+
+    old = ParamSection(makeSectionXML(30))
+    old.createParamfromCSV("xArr -a xPar2 -t Length -1 3 -2 2", "", [["1", "2"], ["3", "4"], ["5", "6"]])
+    new = old.copyOnWrite()
+    assert new.diff(old) == [] and old.diff(new) == []
+
+    new.remove_param("xPar4")
+    new.createParamfromCSV("iNew -a xPar7 -t Integer", "3")
+    moved = new["xPar1"]
+    new.remove_param("xPar1")
+    new.insertAfter("xPar9", moved)
+    new["xPar5"] = 99.5
+    new["xPar6"].flags.add(PARFLG_HIDDEN)
+    new["xPar8"].desc = "Changed"
+    new["xArr"][2][1] = 30.0
+    new["xArr"].setValueByCell((3, 2), 60.0)
+
+    changes = old.diff(new)
+    assert sorted((c.kind, c.name) for c in changes) == sorted([
+        ("delete", "xPar4"), ("insert", "iNew"), ("move", "xPar1"), ("value", "xPar5"), ("flags", "xPar6"),
+        ("desc", "xPar8"), ("cells", "xArr"), ])
+    byKind = {c.kind: c for c in changes}
+    assert byKind[ParamChange.VALUE].old == 5.5 and byKind[ParamChange.VALUE].new == 99.5
+    assert byKind[ParamChange.FLAGS].new == {PARFLG_HIDDEN}
+    assert byKind[ParamChange.CELLS].cells == [((2, 1), 3.0, 30.0), ((3, 2), 6.0, 60.0)]
+    assert byKind[ParamChange.MOVE].new == [p.name for p in new.iterParams()].index("xPar1")
+    assert byKind[ParamChange.MOVE].old == [p.name for p in old.iterParams()].index("xPar1")
+
+    # Resized array: cells only on one side
+    shorter = Param(inType=PAR_LENGTH, inName="xArr", inAVals=[[1.0, 2.0], [3.0, 4.0]])
+    assert old["xArr"].diff(shorter)[0].cells == [((3, 1), 5.0, None), ((3, 2), 6.0, None)]
+
+
+def test_toFile_leaves_no_cached_elements():
+    section = ParamSection(makeSectionXML(30))
+    section["xPar3"].eTree
+    expected = etree.tostring(section.toEtree(), pretty_print=True, xml_declaration=True, encoding='UTF-8')
+    stream = io.BytesIO()
+    section.toFile(stream)
+    assert stream.getvalue() == expected
+    cached = [par.name for par in section.iterParams() if par._eTreeCache is not None]
+    assert cached == ["xPar3"]
+
+
+def test_ParamList_relabels_locally():
+    from GSMParamLib import ParamList, Param, PAR_INT
+
+    params = [Param(inType=PAR_INT, inName="iPar%d" % i, inValue=i) for i in range(2000)]
+    paramList = ParamList(params)
+    farLabels = [paramList.orderKey(p) for p in params[-100:]]
+    anchor = "iPar1000"
+    for i in range(500):
+        # Always right after the same param, so the gap there keeps halving
+        paramList.insertAfter(anchor, Param(inType=PAR_INT, inName="iNew%d" % i, inValue=i))
+    ordered = list(paramList)
+    assert [paramList.orderKey(p) for p in ordered] == sorted(paramList.orderKey(p) for p in ordered)
+    assert len({paramList.orderKey(p) for p in ordered}) == len(ordered)
+    assert [paramList.orderKey(p) for p in params[-100:]] == farLabels
+
+
+def test_copyOnWrite_iteration_keeps_snapshot():
+    from types import SimpleNamespace
+    from GSMParamLib import ParamList
+
+    source = ParamSection(makeSectionXML(300))
+    clone = source.copyOnWrite()
+    paramList = clone._ParamSection__paramList
+    snapshot = paramList._ParamList__getSnapshot()
+    pars = list(iter(clone))
+    # Every param handed out is a private copy put in place, without rebuilding the positional view
+    assert paramList._ParamList__snapshot is snapshot
+    assert all(p is l is s for p, l, s in zip(pars, list(paramList)[1:], snapshot[1:]))
+    assert not any(p is s for p, s in zip(pars, list(source.iterParams())[1:]))
+    assert [paramList.index("xPar%d" % i) for i in (0, 150, 299)] == [1, 166, 329]
+
+    # Repeated names: the slot of the right occurrence is swapped
+    items = [SimpleNamespace(name=n) for n in "abacaba"]
+    plist = ParamList(items)
+    plist[0]
+    for i in (6, 2, 4, 0):
+        new = SimpleNamespace(name=items[i].name)
+        plist.replace(items[i], new)
+        items[i] = new
+        assert all(p is l is s for p, l, s in zip(plist[:], list(plist), items))
+
+
+def test_insert_registers_by_name():
+    from GSMParamLib import Param, PAR_COMMENT, PAR_LENGTH
+
+    section = ParamSection(makeSectionXML(20))
+    section.createParamfromCSV("Block -t Title -a xPar3", "")
+    names = [p.name for p in section.iterParams()]
+    comment = names[names.index("Block") - 1]
+    assert comment.startswith(" Block: PARAMETER BLOCK") and names.index("Block") == names.index("xPar3") + 2
+    assert section["Block"].name == "Block" and comment not in section
+
+    # Repeated names: inserting next to the first one, which also stays the one found by name
+    first = section["xPar5"]
+    second = Param(inType=PAR_LENGTH, inName="xPar5", inValue=2.0)
+    section.insertAfter("xPar7", second)
+    section.insertBefore("xPar5", Param(inType=PAR_LENGTH, inName="xNew", inValue=1.0))
+    section.insertAfter("xPar5", Param(inType=PAR_COMMENT, inName=" after xPar5 "))
+    names = [p.name for p in section.iterParams()]
+    assert names.index("xNew") + 1 == names.index("xPar5") == names.index(" after xPar5 ") - 1
+    assert names.count("xPar5") == 2 and section["xPar5"] is first
@@ -0,0 +1,248 @@
+import os
+
+import pytest
+
+from GSMXMLLib import SourceXML, XMLFile, parseXMLFile, getXMLParser
+from lxml import etree
+from test_ParamSection import makeSectionXML
+
+
+def makeSourceXML(inDir, inName, inGUID, inParamCount=20, inMacros=()):
+    """
+    Writes a synthetic GSM XML with inParamCount params, calling the macros in inMacros
+    :return:    file name relative to inDir
+    """
+    macros = "".join('<Macro><MName><![CDATA["%s"]]></MName><MainGUID>%s</MainGUID></Macro>' % (m, "G-" + m) for m in inMacros)
+    section = etree.tostring(makeSectionXML(inParamCount)).decode()
+    xml = ('<Symbol IsArchivable="no" IsPlaceable="yes" MainGUID="%s" MigrationValue="Normal" Owner="0" Signature="0" Version="44">'
+           '<Ancestry SectVersion="1" SectionFlags="0" SubIdent="0"><MainGUID>F938E33A-329D-4A36-BE3E-85E126820996</MainGUID></Ancestry>'
+           '<CalledMacros SectVersion="2" SectionFlags="0" SubIdent="0">%s</CalledMacros>'
+           '%s'
+           '<Script_3D SectVersion="20" SectionFlags="0" SubIdent="0"><![CDATA[block xPar1, xPar2, 1\ncall "%s"]]></Script_3D>'
+           '<Keywords SectVersion="1" SectionFlags="0" SubIdent="0"><![CDATA[\nkw_%s, common\n]]></Keywords>'
+           '<Picture SectVersion="19" SectionFlags="0" SubIdent="0" path="pict/%s.png"/>'
+           '<GDLPict SectVersion="19" SectionFlags="0" SubIdent="1" path="pict/%s_1.png"/>'
+           '</Symbol>' % (inGUID, macros, section, inMacros[0] if inMacros else "", inName, inName, inName))
+    relPath = inName + ".xml"
+    with open(os.path.join(inDir, relPath), "w") as f:
+        f.write(xml)
+    return relPath
+
+
+@pytest.fixture
+def sourceLibrary(tmp_path):
+    # Two files share a GUID, the first one must win in source_guids
+    relPaths = [makeSourceXML(str(tmp_path), "Macro%02d" % i, "GUID-%d" % (i % 9), inMacros=("Macro%02d" % ((i + 1) % 12), ))
+                for i in range(12)]
+    SourceXML.sSourceXMLDir = str(tmp_path)
+    yield relPaths
+    SourceXML.source_guids.clear()
+    SourceXML.replacement_dict.clear()
+    XMLFile.all_keywords.clear()
+
+
+def _registries():
+    return (dict(SourceXML.source_guids), {k: v.fullPath for k, v in SourceXML.replacement_dict.items()}, set(XMLFile.all_keywords))
+
+
+@pytest.mark.parametrize("inLazy", (False, True, ))
+def test_loadLibrary_parallel_same_as_sequential(sourceLibrary, inLazy):
+    SourceXML.bLazyParams = inLazy
+    try:
+        sequential = [SourceXML(relPath) for relPath in sourceLibrary]
+        expected = _registries()
+        SourceXML.source_guids.clear()
+        SourceXML.replacement_dict.clear()
+        XMLFile.all_keywords.clear()
+
+        parallel = SourceXML.loadLibrary(sourceLibrary, processes=2, chunk_size=2)
+    finally:
+        SourceXML.bLazyParams = False
+    assert _registries() == expected
+    assert SourceXML.source_guids["GUID-1"] == "Macro01"
+    for one, other in zip(sequential, parallel):
+        assert (one.name, one.guid, one.calledMacros, one.scripts, one.keywords) == \
+               (other.name, other.guid, other.calledMacros, other.scripts, other.keywords)
+        assert etree.tostring(one.parameters.toEtree()) == etree.tostring(other.parameters.toEtree())
+
+
+def test_cache_warm_load_skips_parsing(sourceLibrary, tmp_path, monkeypatch):
+    import GSMXMLLib
+    from GSMXMLLib import SourceXMLCache
+
+    SourceXML.cache = SourceXMLCache(str(tmp_path / "cache"))
+    try:
+        cold = SourceXML(sourceLibrary[0])
+        with monkeypatch.context() as m:
+            m.setattr(GSMXMLLib, "parseXMLFile", None)
+            warm = SourceXML(sourceLibrary[0])
+        assert (warm.guid, warm.calledMacros, warm.scripts, warm.keywords, warm.parentSubTypes) == \
+               (cold.guid, cold.calledMacros, cold.scripts, cold.keywords, cold.parentSubTypes)
+        assert etree.tostring(warm.parameters.toEtree()) == etree.tostring(cold.parameters.toEtree())
+
+        # Changed file: the entry is invalid
+        fullPath = os.path.join(SourceXML.sSourceXMLDir, sourceLibrary[0])
+        with open(fullPath) as f:
+            xml = f.read()
+        with open(fullPath, "w") as f:
+            f.write(xml.replace("common", "uncommon"))
+        assert SourceXML(sourceLibrary[0]).keywords == ["uncommon"]
+    finally:
+        SourceXML.cache = None
+
+
+def test_cache_evicts_least_recently_used(sourceLibrary, tmp_path):
+    from GSMXMLLib import SourceXMLCache
+
+    cache = SourceXMLCache(str(tmp_path / "cache"))
+    SourceXML.cache = cache
+    try:
+        for relPath in sourceLibrary[:3]:
+            SourceXML(relPath)
+        entrySize = os.path.getsize(cache.entryPath(os.path.join(SourceXML.sSourceXMLDir, sourceLibrary[0])))
+        fullPaths = [os.path.join(SourceXML.sSourceXMLDir, relPath) for relPath in sourceLibrary[:3]]
+        for i, fullPath in enumerate(fullPaths):
+            os.utime(cache.entryPath(fullPath), ns=(i * 10 ** 9, i * 10 ** 9))
+        cache.trim(entrySize * 2 + entrySize // 2)
+        assert [os.path.isfile(cache.entryPath(p)) for p in fullPaths] == [False, True, True]
+    finally:
+        SourceXML.cache = None
+
+
+def test_header_only_defers_full_load(sourceLibrary, monkeypatch):
+    import GSMXMLLib
+
+    full = SourceXML(sourceLibrary[3], register=False)
+    with monkeypatch.context() as m:
+        m.setattr(GSMXMLLib, "parseXMLFile", None)
+        header = SourceXML(sourceLibrary[3], header_only=True)
+        assert (header.iVersion, header.ID, header.guid, header.bPlaceable, header.parentSubTypes, header.calledMacros) == \
+               (full.iVersion, full.ID, full.guid, full.bPlaceable, full.parentSubTypes, full.calledMacros)
+        assert "kw_Macro03" not in XMLFile.all_keywords and "common" not in XMLFile.all_keywords
+    assert header.scripts == full.scripts
+    assert (header.keywords, header.gdlPicts, header.prevPict) == (full.keywords, full.gdlPicts, full.prevPict)
+    assert etree.tostring(header.parameters.toEtree()) == etree.tostring(full.parameters.toEtree())
+    assert "common" in XMLFile.all_keywords
+
+
+def test_header_only_stops_before_params(sourceLibrary):
+    # The scan must not get past the start of ParamSection: the broken end of the file is never read
+    fullPath = os.path.join(SourceXML.sSourceXMLDir, sourceLibrary[4])
+    with open(fullPath) as f:
+        xml = f.read()
+    start = xml.index("<ParamSection")
+    end = xml.index(">", start) + 1
+    with open(fullPath, "w") as f:
+        f.write(xml[:end] + "<!--%s-->" % ("x" * 1024 * 1024) + "<broken")
+    header = SourceXML(sourceLibrary[4], header_only=True)
+    assert (header.guid, header.parentSubTypes, header.calledMacros) == \
+           ("GUID-4", ["F938E33A-329D-4A36-BE3E-85E126820996"], {"G-Macro05": "Macro05"})
+
+
+def test_parseXMLFile_same_as_parse(sourceLibrary, tmp_path):
+    path = str(tmp_path / sourceLibrary[0])
+    expected = etree.tostring(etree.parse(path, etree.XMLParser(strip_cdata=False)))
+    assert etree.tostring(parseXMLFile(path)) == expected
+    assert etree.tostring(parseXMLFile(path, memory_map=False)) == expected
+    assert b"<![CDATA[" in expected
+    assert getXMLParser() is getXMLParser()
+
+    open(str(tmp_path / "empty.xml"), "w").close()
+    with pytest.raises(etree.XMLSyntaxError):
+        parseXMLFile(str(tmp_path / "empty.xml"))
+
+
+def test_getGDLIdentifiers_skips_comments_and_strings():
+    from GSMXMLLib import getGDLIdentifiers
+
+    script = 'a = b + 1.5e3 ! c d\ntext2 0, 0, "e ! f" + `g`\nIF zzYMax>2 THEN ~tmp_1 = 2'
+    assert getGDLIdentifiers(script) == {"A", "B", "TEXT2", "IF", "ZZYMAX", "THEN", "~TMP_1", }
+
+
+def test_parameter_usage(sourceLibrary):
+    from GSMParamLib import Param, PAR_LENGTH
+
+    for relPath in sourceLibrary:
+        SourceXML(relPath)
+    usage = SourceXML.getParameterUsage()
+    assert usage["Macro00"] == {"xPar1", "xPar2", }
+    source = SourceXML.replacement_dict["MACRO00"]
+    assert source.checkParameterUsage(Param(inType=PAR_LENGTH, inName="XPAR2", inValue=1.0), set())
+    assert not source.checkParameterUsage(Param(inType=PAR_LENGTH, inName="xPar", inValue=1.0), set())
+
+
+def test_call_graph(sourceLibrary, tmp_path):
+    # D calls A calls B, B and C call each other
+    calls = {"A": ("B", ), "B": ("C", ), "C": ("B", ), "D": ("A", "Missing", ), "E": (), }
+    for name, macros in calls.items():
+        SourceXML(makeSourceXML(str(tmp_path), name, "GUID-" + name, 2, macros))
+    graph = SourceXML.getCallGraph()
+    assert graph is SourceXML.getCallGraph()
+    assert graph.getCycles() == [frozenset({"B", "C", })]
+    order = graph.topologicalOrder()
+    assert order.index("B") < order.index("A") < order.index("D")
+    assert order.index("C") < order.index("A")
+    assert graph.getClosure("a") == {"A", "B", "C", }
+    assert graph.getClosure("E") == {"E", }
+    assert "XPAR1" in graph.getReachableIdentifiers("D")
+
+
+def test_parameter_usage_through_excluded_macros(sourceLibrary, tmp_path):
+    from GSMParamLib import Param, PAR_LENGTH
+
+    # D calls A calls B, B and C call each other; only C uses xDeep
+    calls = {"A": ("B", ), "B": ("C", ), "C": ("B", ), "D": ("A", "Missing", ), }
+    for name, macros in calls.items():
+        relPath = makeSourceXML(str(tmp_path), name, "GUID-" + name, 2, macros)
+        if name == "C":
+            with open(str(tmp_path / relPath)) as f:
+                xml = f.read()
+            with open(str(tmp_path / relPath), "w") as f:
+                f.write(xml.replace("block xPar1", "block xDeep"))
+        SourceXML(relPath)
+    source = SourceXML.replacement_dict["D"]
+    par = Param(inType=PAR_LENGTH, inName="xDeep", inValue=1.0)
+    assert source.checkParameterUsage(par, set()) and source.checkParameterUsage(par, {"Missing"})
+    # Not gone through the excluded macros, so C isn't reached either
+    for excluded in ({"A"}, {"b"}, {"C"}, ):
+        assert not source.checkParameterUsage(par, excluded)
+    assert SourceXML.getCallGraph().getClosure("D", {"B"}) == {"D", "A", }
+
+
+def test_library_contexts_side_by_side(tmp_path):
+    from GSMXMLLib import LibraryContext, DestXML
+
+    contexts = []
+    for lib in ("lib1", "lib2", ):
+        os.makedirs(str(tmp_path / lib))
+        relPaths = [makeSourceXML(str(tmp_path / lib), "%s_%d" % (lib, i), "GUID-%s-%d" % (lib, i)) for i in range(3)]
+        context = LibraryContext(source_xml_dir=str(tmp_path / lib), dest_xml_dir=str(tmp_path / "dest" / lib))
+        sources = SourceXML.loadLibrary(relPaths, processes=2, context=context)
+        DestXML(sources[0])
+        contexts.append(context)
+
+    assert set(contexts[0].replacement_dict) == {"LIB1_0", "LIB1_1", "LIB1_2", }
+    assert set(contexts[1].source_guids) == {"GUID-LIB2-0", "GUID-LIB2-1", "GUID-LIB2-2", }
+    assert list(contexts[1].id_dict) == ["GUID-LIB2-0"]
+    assert contexts[1].dest_dict["LIB2_0"].fullPath.startswith(str(tmp_path / "dest" / "lib2"))
+    assert contexts[0].all_keywords == {"common", }
+    assert not SourceXML.replacement_dict and not DestXML.id_dict and not XMLFile.all_keywords
+    assert SourceXML.getCallGraph(contexts[0]) is not SourceXML.getCallGraph(contexts[1])
+
+
+def test_basePath_shared_by_default_context_files():
+    from GSMXMLLib import GeneralFile, LibraryContext
+
+    class File(GeneralFile):
+        pass
+
+    first = File.__new__(File)
+    first.basePath = "base"
+    assert File("a.xml").fullPath == os.path.join("base", "a.xml")
+
+    other = File.__new__(File)
+    other.context = LibraryContext()
+    with pytest.raises(GeneralFile.BasePathNotSetException):
+        other.basePath
+    other.basePath = "other"
+    assert other.basePath == "other" and first.basePath == "base"